@@ -1,17 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from api.models import Person, Log
+from api.models import Person, Log, ScanEvent
 from .models import Profile
 
 # ----- Person Admin -----
 @admin.register(Person)
 class PersonAdmin(admin.ModelAdmin):
     list_display = ('display_id', 'name', 'nisit', 'degree', 'seat', 'rfid', 'date')
-    list_filter = ('degree', 'verified1', 'verified2', 'verified3', 'read_flag', 'read_light')
+    list_filter = ('degree', 'current_status', 'verified1', 'verified2', 'verified3', 'read_flag', 'read_light')
     search_fields = ('name', 'nisit', 'rfid')
     ordering = ('seat',)
-    readonly_fields = ('date',)
+    readonly_fields = ('date', 'updated_at', 'current_status', 'status_changed_at')
 
     fieldsets = (
         ('ข้อมูลนิสิต', {
@@ -22,11 +22,12 @@ class PersonAdmin(admin.ModelAdmin):
                 ('verified1', 'verified_updated_at1'),
                 ('verified2', 'verified_updated_at2'),
                 ('verified3', 'verified_updated_at3'),
+                ('current_status', 'status_changed_at'),
                 ('read_flag', 'read_light'),
             )
         }),
         ('ข้อมูลระบบ', {
-            'fields': ('date',),
+            'fields': ('date', 'updated_at'),
         }),
     )
 
@@ -50,6 +51,15 @@ class LogAdmin(admin.ModelAdmin):
         return obj.details[:60] + ('...' if len(obj.details) > 60 else '')
     short_details.short_description = 'รายละเอียด'
 
+# ----- ScanEvent Admin -----
+@admin.register(ScanEvent)
+class ScanEventAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'epc', 'person_id', 'scanner_id', 'direction')
+    list_filter = ('scanner_id', 'direction', 'timestamp')
+    search_fields = ('epc',)
+    ordering = ('-timestamp',)
+    readonly_fields = ('timestamp', 'epc', 'person', 'scanner_id', 'direction')
+
 class ProfileInline(admin.StackedInline):
     model = Profile
     can_delete = False
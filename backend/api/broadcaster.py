@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .consumers import broadcast_stats_update, broadcast_degree_breakdown
+
+logger = logging.getLogger(__name__)
+
+
+class StatsBroadcaster:
+    """ส่งข้อความ stats และ degree_stats ทาง WebSocket แบบรวมครั้ง
+
+    ผู้เรียกแค่ mark_dirty() แล้วกลับไปทำงานต่อ ส่วน sender thread ตัวเดียว
+    จะคำนวณสถิติล่าสุดแล้วส่งไม่เกินหนึ่งครั้งต่อ STATS_BROADCAST_INTERVAL_MS
+    การ mark หลายครั้งในช่วงเดียวกันจึงกลายเป็นการส่งครั้งเดียว
+    ถ้าตั้งเป็น 0 จะส่งทันทีในโปรเซสของผู้เรียกเหมือนเดิม
+    """
+
+    def __init__(self):
+        self._dirty = threading.Event()
+        self._sender = None
+        self._lock = threading.Lock()
+        self._last_sent = 0.0
+        self.marked = 0
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def interval(self):
+        return getattr(settings, 'STATS_BROADCAST_INTERVAL_MS', 500) / 1000
+
+    def _ensure_sender(self):
+        with self._lock:
+            if self._sender is None or not self._sender.is_alive():
+                self._sender = threading.Thread(target=self._run, name='stats-broadcaster', daemon=True)
+                self._sender.start()
+
+    def mark_dirty(self):
+        if not getattr(settings, 'USE_CHANNEL', False):
+            return
+        self.marked += 1
+        if self.interval <= 0:
+            self._send()
+            return
+        self._ensure_sender()
+        self._dirty.set()
+
+    def _send(self):
+        try:
+            broadcast_stats_update()
+            broadcast_degree_breakdown()
+            self.sent += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Stats broadcast failed")
+        self._last_sent = time.monotonic()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            # รอให้ครบช่วงเวลานับจากการส่งครั้งก่อน ระหว่างนี้การ mark ใหม่จะถูกรวมเข้าด้วยกัน
+            delay = self._last_sent + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._dirty.clear()
+            close_old_connections()
+            try:
+                self._send()
+            finally:
+                close_old_connections()
+
+    def stats(self):
+        return {
+            'interval_ms': int(self.interval * 1000),
+            'pending': self._dirty.is_set(),
+            'marked': self.marked,
+            'sent': self.sent,
+            'failed': self.failed,
+        }
+
+
+stats_broadcaster = StatsBroadcaster()
@@ -0,0 +1,80 @@
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from .epc_index import EPCEntry, ENTRY_FIELDS
+from .models import Person, PersonTombstone, VALID_STATUSES
+from .signals import bulk_person_delete
+from .stats import refresh_current_status
+from .versioning import persons_bulk_changed
+
+VERIFIED_FIELDS = ['verified1', 'verified2', 'verified3']
+
+
+def bulk_set_verified(ids, verified_field, value):
+    """ตั้ง verified1..3 ของหลายคนด้วย UPDATE เดียว เฉพาะแถวที่ค่ายังไม่ตรง
+
+    คืนค่า (changed_ids, changes) โดย changes เป็น [{'id', 'fields'}] ของฟิลด์ที่เปลี่ยน
+    """
+    time_field = verified_field.replace('verified', 'verified_updated_at')
+    now = timezone.now()
+
+    with transaction.atomic():
+        before = dict(
+            Person.objects.select_for_update()
+            .filter(id__in=ids)
+            .exclude(**{verified_field: value})
+            .order_by('id')
+            .values_list('id', 'current_status')
+        )
+        if not before:
+            return [], []
+
+        changed = Person.objects.filter(id__in=before.keys())
+        values = {verified_field: value, time_field: now, 'updated_at': now}
+        if value in VALID_STATUSES:
+            # ช่องที่เพิ่งแก้มีเวลาใหม่ที่สุด จึงเป็น current_status ด้วย
+            changed.update(**values, current_status=value, status_changed_at=now)
+        else:
+            changed.update(**values)
+            refresh_current_status(changed)
+
+        after = changed.order_by('id').values_list('rfid', *ENTRY_FIELDS, 'status_changed_at')
+        deltas = Counter()
+        entries = {}
+        changes = []
+        for rfid, *entry_values, status_changed_at in after:
+            entry = EPCEntry(*entry_values)
+            deltas[before[entry.id]] -= 1
+            deltas[entry.current_status] += 1
+            if rfid:
+                entries[rfid] = entry
+            changes.append({'id': entry.id, 'fields': {
+                verified_field: value,
+                time_field: now,
+                'current_status': entry.current_status,
+                'status_changed_at': status_changed_at,
+            }})
+
+        persons_bulk_changed(entries, deltas)
+
+    return list(before), changes
+
+
+def delete_persons(persons):
+    """ลบ Person ตาม queryset พร้อมบันทึก tombstone ด้วย INSERT เดียว คืนค่ารายการ id ที่ลบ
+
+    receiver post_delete ของแต่ละแถวถูกข้าม ดัชนี EPC ตัวนับสถิติ และเวอร์ชันข้อมูลจึงปรับหลัง commit ครั้งเดียว
+    """
+    with transaction.atomic():
+        rows = list(persons.order_by('id').values_list('id', 'current_status'))
+        if not rows:
+            return []
+        ids = [pk for pk, _ in rows]
+        with bulk_person_delete():
+            Person.objects.filter(id__in=ids).delete()
+        PersonTombstone.record(ids)
+        deltas = Counter()
+        for _, status in rows:
+            deltas[status] -= 1
+        persons_bulk_changed({}, deltas, ids)
+    return ids
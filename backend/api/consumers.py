@@ -2,11 +2,14 @@ from channels.generic.websocket import AsyncWebsocketConsumer, AsyncJsonWebsocke
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.conf import settings
-from collections import Counter
-from .models import Person
-from datetime import datetime, timezone
+from .stats import person_stats, degree_breakdown
+from .serializers import convert_datetime_fields
 import json
 
+DATETIME_FIELDS = [
+    'verified_updated_at1', 'verified_updated_at2', 'verified_updated_at3', 'status_changed_at',
+]
+
 def safe_group_send(group_name, message_type, message_content):
     # เช็คก่อนว่าเปิดใช้ channels ไหม
     if not getattr(settings, 'USE_CHANNEL', False):
@@ -30,22 +33,37 @@ def broadcast_to_crud01(message):
     print("Broadcasting message to crud01_group:", message)
     safe_group_send("crud01_group", "send_message", message)
 
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def ws_bulk_max_items():
+    return getattr(settings, 'WS_BULK_MAX_ITEMS', 500)
+
+def broadcast_bulk_update(changes, **extra):
+    # หลายแถวในข้อความเดียว changes: [{'id', 'fields'}] (fields มีเฉพาะค่าที่เปลี่ยน)
+    # แบ่งเป็นหลายข้อความไม่เกินข้อความละ WS_BULK_MAX_ITEMS แถว
+    items = [
+        {'id': change['id'], 'fields': convert_datetime_fields(dict(change['fields']), DATETIME_FIELDS)}
+        for change in changes
+    ]
+    for chunk in _chunks(items, ws_bulk_max_items()):
+        safe_group_send("crud01_group", "send_message", {
+            "action": "bulk_update",
+            "items": chunk,
+            **extra,
+        })
+
+def broadcast_bulk_delete(ids):
+    ids = list(ids)
+    for chunk in _chunks(ids, ws_bulk_max_items()):
+        safe_group_send("crud01_group", "send_message", {
+            "action": "bulk_delete",
+            "ids": chunk,
+        })
+
 def broadcast_stats_update():
-    persons = Person.objects.all()
-    total = persons.count()
-
-    verified_counter = Counter()
-    for person in persons:
-        latest_verified = get_latest_verified(person)
-        if latest_verified in [0, 1, 2]:
-            verified_counter[latest_verified] += 1
-
-    stats = {
-        'total': total,
-        'checked_in': verified_counter[0],
-        'in_checkin_room': verified_counter[1],
-        'in_graduation_room': verified_counter[2],
-    }
+    stats = person_stats()
 
     print("Stats:", stats)
     safe_group_send("crud01_group", "send_update", {
@@ -53,37 +71,18 @@ def broadcast_stats_update():
         "data": stats
     })
 
+def broadcast_degree_breakdown():
+    safe_group_send("crud01_group", "send_update", {
+        "action": "degree_stats",
+        "data": degree_breakdown()
+    })
+
 def broadcast_ws(action, data=None):
     safe_group_send("crud01_group", "send_message", {
         "action": action,
         "data": data or {}
     })
 
-def get_latest_verified(person):
-    times = {
-        1: person.verified_updated_at1 or datetime.min.replace(tzinfo=timezone.utc),
-        2: person.verified_updated_at2 or datetime.min.replace(tzinfo=timezone.utc),
-        3: person.verified_updated_at3 or datetime.min.replace(tzinfo=timezone.utc),
-    }
-    values = {
-        1: person.verified1,
-        2: person.verified2,
-        3: person.verified3,
-    }
-
-    latest_time = None
-    latest_verified = None
-
-    for key in [1, 2, 3]:
-        value = values[key]
-        if value in [0, 1, 2]:
-            time = times[key]
-            if not latest_time or time > latest_time:
-                latest_time = time
-                latest_verified = value
-
-    return latest_verified if latest_verified is not None else -1
-
 # เก็บชื่อ channel ของผู้เชื่อมต่อทั้งหมด
 connected_clients = set()
 
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class ScanDebouncer:
+    """กันการอ่านซ้ำของแท็กเดิมจากเครื่องอ่านเดิมภายในช่วงเวลา TTL
+
+    key คือ (epc, scanner_id, scanner_type) เก็บเวลาที่รับการอ่านครั้งล่าสุด
+    การอ่านซ้ำภายใน TTL จะถูกตัดทิ้งโดยไม่แตะฐานข้อมูล
+    จำนวน key มีเพดาน เมื่อเต็มจะลบ key ที่เก่าที่สุดออก
+    """
+
+    def __init__(self):
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.dropped = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RFID_DEBOUNCE_SECONDS', 2.0)
+
+    @property
+    def max_keys(self):
+        return getattr(settings, 'RFID_DEBOUNCE_MAX_KEYS', 50000)
+
+    def accept(self, epcs, scanner_type, scanner_id):
+        """คืนค่า list ของ bool ตามลำดับ epcs ว่าการอ่านไหนผ่าน (True) หรือซ้ำ (False)"""
+        ttl = self.ttl
+        if ttl <= 0:
+            self.accepted += len(epcs)
+            return [True] * len(epcs)
+
+        now = time.monotonic()
+        flags = []
+        with self._lock:
+            for epc in epcs:
+                key = (epc, scanner_id, scanner_type)
+                last = self._seen.get(key)
+                if last is not None and now - last < ttl:
+                    flags.append(False)
+                    continue
+                self._seen[key] = now
+                self._seen.move_to_end(key)
+                flags.append(True)
+
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+
+        passed = sum(flags)
+        self.accepted += passed
+        self.dropped += len(flags) - passed
+        return flags
+
+    def forget(self, epcs, scanner_type, scanner_id):
+        # ใช้เมื่อเขียนลงฐานข้อมูลไม่สำเร็จ เพื่อให้การอ่านครั้งถัดไปไม่ถูกตัดทิ้ง
+        with self._lock:
+            for epc in epcs:
+                self._seen.pop((epc, scanner_id, scanner_type), None)
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+
+    def stats(self):
+        return {
+            'ttl': self.ttl,
+            'size': len(self._seen),
+            'accepted': self.accepted,
+            'dropped': self.dropped,
+        }
+
+
+scan_debouncer = ScanDebouncer()
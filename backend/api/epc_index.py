@@ -0,0 +1,150 @@
+import threading
+from collections import namedtuple
+from django.conf import settings
+from .versioning import data_version
+
+# ข้อมูลขั้นต่ำที่หน้าสแกนต้องใช้ ไม่ต้อง query ตาราง Person
+EPCEntry = namedtuple('EPCEntry', ['id', 'name', 'verified1', 'verified2', 'verified3', 'current_status'])
+
+ENTRY_FIELDS = ('id', 'name', 'verified1', 'verified2', 'verified3', 'current_status')
+
+
+def entry_status(entry, scanner_id):
+    return getattr(entry, f'verified{scanner_id}')
+
+
+def entry_with_status(entry, scanner_id, value):
+    # ช่องที่เพิ่งสแกนเป็นช่องล่าสุดเสมอ current_status จึงเท่ากับค่าใหม่
+    return entry._replace(**{f'verified{scanner_id}': value, 'current_status': value})
+
+
+class EPCIndex:
+    """ดัชนี EPC -> EPCEntry ในหน่วยความจำของโปรเซส
+
+    โหลดครั้งแรกเมื่อมีการสแกน แล้วอัปเดตตาม signal ของ Person
+    (ดู api/signals.py) และตามการเขียนแบบ bulk ใน api/rfid.py
+    ดัชนีจำเวอร์ชันข้อมูล (api/versioning.py) ที่โหลดมา ถ้าโปรเซสอื่นเขียนจนเวอร์ชันเปลี่ยนจะโหลดใหม่
+    ค่าในดัชนีเป็นแค่คำใบ้: api/rfid.py เขียนสถานะแบบมีเงื่อนไขและนับจากแถวที่เปลี่ยนจริง
+    การเขียนที่ไม่เลื่อนเวอร์ชัน (เช่น .update() ตรง ๆ) จึงไม่ทำให้ผลผิด
+    """
+
+    def __init__(self):
+        self._entries = None   # epc -> EPCEntry
+        self._epc_by_id = {}   # person id -> epc
+        self._version = None   # เวอร์ชันข้อมูลที่ดัชนีตรงกับฐานข้อมูล
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'RFID_INDEX_ENABLED', True)
+
+    @property
+    def loaded(self):
+        return self._entries is not None
+
+    def _load(self, version):
+        from .models import Person
+
+        rows = (
+            Person.objects.exclude(rfid__isnull=True).exclude(rfid='')
+            .values_list('rfid', *ENTRY_FIELDS)
+        )
+        entries = {}
+        epc_by_id = {}
+        for rfid, *values in rows:
+            entry = EPCEntry(*values)
+            entries[rfid] = entry
+            epc_by_id[entry.id] = rfid
+        self._entries = entries
+        self._epc_by_id = epc_by_id
+        self._version = version
+        self.loads += 1
+
+    def lookup(self, epcs):
+        """คืนค่า (found, missing) โดย found เป็น dict epc -> EPCEntry"""
+        # อ่านเวอร์ชันก่อนโหลดแถว การเขียนที่เกิดระหว่างโหลดจะทำให้โหลดใหม่ในครั้งถัดไป
+        version = data_version()
+        with self._lock:
+            if self._entries is None or self._version != version:
+                self._load(version)
+            found = {}
+            missing = []
+            for epc in epcs:
+                entry = self._entries.get(epc)
+                if entry is None:
+                    missing.append(epc)
+                else:
+                    found[epc] = entry
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing
+
+    def peek(self, epc):
+        # อ่านโดยไม่นับ hit/miss และไม่บังคับโหลด
+        with self._lock:
+            if self._entries is None:
+                return None
+            return self._entries.get(epc)
+
+    def store(self, entries):
+        """บันทึก dict epc -> EPCEntry ที่เพิ่งเขียนลงฐานข้อมูล"""
+        with self._lock:
+            if self._entries is None:
+                return
+            for epc, entry in entries.items():
+                old_epc = self._epc_by_id.get(entry.id)
+                if old_epc is not None and old_epc != epc:
+                    self._entries.pop(old_epc, None)
+                self._entries[epc] = entry
+                self._epc_by_id[entry.id] = epc
+
+    def advance(self, version):
+        """เรียกหลังปรับดัชนีตามการเขียนของโปรเซสนี้ และเลื่อนเวอร์ชันเป็น version แล้ว
+
+        ถ้าไม่มีโปรเซสอื่นเลื่อนแทรก (version ต่อจากค่าเดิมพอดี) ดัชนียังตรงกับฐานข้อมูล ไม่ต้องโหลดใหม่
+        """
+        with self._lock:
+            if self._entries is not None and self._version == version - 1:
+                self._version = version
+
+    def set_person(self, pk, rfid, entry):
+        with self._lock:
+            if self._entries is None:
+                return
+            if not rfid:
+                self.remove_person(pk)
+                return
+            self.store({rfid: entry})
+
+    def remove_person(self, pk):
+        with self._lock:
+            if self._entries is None:
+                return
+            epc = self._epc_by_id.pop(pk, None)
+            if epc is not None:
+                self._entries.pop(epc, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+            self._epc_by_id = {}
+            self._version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'loaded': self.loaded,
+            'version': self._version,
+            'size': len(self._entries) if self._entries is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'loads': self.loads,
+        }
+
+
+epc_index = EPCIndex()
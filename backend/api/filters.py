@@ -0,0 +1,66 @@
+from django.db.models import Q
+from .models import VALID_STATUSES
+
+# ตัวกรองของ GET /api/person/ ใช้ index ที่ประกาศไว้ใน Person.Meta.indexes
+# (หรือ unique index ของ nisit/seat/rfid)
+RFID_FILTERS = {'bound': False, 'unbound': True}
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def filter_persons(queryset, params):
+    """กรอง Person ตาม query string คืนค่า (queryset, errors)
+
+    q=<คำนำหน้าชื่อหรือรหัสนิสิต>  degree=<ชื่อปริญญา> (ใส่ซ้ำได้)
+    seat_min / seat_max  rfid=bound|unbound  status=0,1,2 (current_status)
+    verified1 / verified2 / verified3=<ค่า>
+    """
+    errors = {}
+
+    q = params.get('q', '').strip()
+    if q:
+        # ค้นแบบขึ้นต้นด้วยคำที่ให้ เพื่อให้ใช้ index ได้ (LIKE 'q%')
+        # ใช้ istartswith เพราะ startswith บน MySQL เป็น LIKE BINARY ซึ่งใช้ index ที่ collation ไม่สนตัวพิมพ์ไม่ได้
+        queryset = queryset.filter(Q(name__istartswith=q) | Q(nisit__istartswith=q))
+
+    degrees = [degree for degree in params.getlist('degree') if degree]
+    if degrees:
+        queryset = queryset.filter(degree__in=degrees)
+
+    for param, lookup in (('seat_min', 'seat__gte'), ('seat_max', 'seat__lte')):
+        value = params.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: int(value)})
+            except ValueError:
+                errors[param] = 'ต้องเป็นตัวเลข'
+
+    rfid = params.get('rfid')
+    if rfid:
+        if rfid not in RFID_FILTERS:
+            errors['rfid'] = 'ต้องเป็น bound หรือ unbound'
+        elif RFID_FILTERS[rfid]:
+            queryset = queryset.filter(Q(rfid__isnull=True) | Q(rfid=''))
+        else:
+            # rfid > '' ตัดทั้ง NULL และค่าว่าง และเป็นช่วงบน unique index ของ rfid (NOT NULL AND <> '' ต้องสแกนทั้งตาราง)
+            queryset = queryset.filter(rfid__gt='')
+
+    statuses = params.get('status')
+    if statuses:
+        try:
+            queryset = queryset.filter(current_status__in=_int_list(statuses))
+        except ValueError:
+            errors['status'] = f'ต้องเป็นตัวเลขคั่นด้วยจุลภาค เช่น {",".join(map(str, VALID_STATUSES))}'
+
+    for i in (1, 2, 3):
+        param = f'verified{i}'
+        value = params.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{param: int(value)})
+            except ValueError:
+                errors[param] = 'ต้องเป็นตัวเลข'
+
+    return queryset, errors
@@ -0,0 +1,212 @@
+from collections import Counter
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .epc_index import EPCEntry
+from .models import Person, SeatCounter
+from .resources import PersonResource
+from .versioning import persons_bulk_changed
+
+# ฟิลด์ที่ไฟล์นำเข้าเขียนได้ (ตาม PersonResource) และฟิลด์ที่ต้องคำนวณ/ตั้งเองเพราะไม่ผ่าน Person.save
+IMPORT_FIELDS = ['name', 'nisit', 'degree', 'seat', 'verified1', 'rfid']
+DERIVED_FIELDS = ['current_status', 'status_changed_at', 'updated_at']
+
+
+class ImportRowsError(ValueError):
+    """ไฟล์มีแถวที่ไม่ถูกต้อง ทั้งไฟล์จึงไม่ถูกนำเข้า errors เป็นข้อความรายแถว"""
+
+    def __init__(self, errors):
+        super().__init__(f"ไฟล์มีแถวที่ไม่ถูกต้อง {len(errors)} แถว จึงไม่ได้นำเข้าข้อมูล")
+        self.errors = errors
+
+
+def _row_messages(errors):
+    return [f"แถวที่ {number}: {message}" for number, message in sorted(errors)]
+
+
+def import_batch_size():
+    return getattr(settings, 'IMPORT_BATCH_SIZE', 500)
+
+
+def _blank(value):
+    return value is None or not str(value).strip()
+
+
+def _text(value):
+    # Excel อาจให้ตัวเลขเป็น float เช่น 6512345678.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _clean(field, value):
+    if field == 'seat':
+        return None if _blank(value) else int(float(value))
+    if field == 'rfid':
+        return None if _blank(value) else _text(value)
+    if field == 'verified1':
+        return value
+    return '' if value is None else _text(value)
+
+
+def _unique_conflicts(persons):
+    """หาคนที่ที่นั่งหรือ RFID ชนกับคนก่อนหน้าในไฟล์ หรือกับคนในฐานข้อมูลที่ไม่ได้อยู่ในไฟล์
+
+    คืนค่า dict nisit -> ข้อความผิดพลาด (คนแรกในไฟล์ที่ใช้ค่านั้นได้ไป)
+    """
+    seats = [person.seat for person in persons if person.seat]
+    rfids = [person.rfid for person in persons if person.rfid]
+    holders = (
+        Person.objects.filter(Q(seat__in=seats) | Q(rfid__in=rfids))
+        .exclude(nisit__in=[person.nisit for person in persons])
+        .values_list('seat', 'rfid')
+    )
+    taken_seats = {seat for seat, _ in holders}
+    taken_rfids = {rfid for _, rfid in holders if rfid}
+
+    conflicts = {}
+    for person in persons:
+        if person.seat and person.seat in taken_seats:
+            conflicts[person.nisit] = f"ที่นั่ง {person.seat} ซ้ำกับคนอื่น"
+        elif person.rfid and person.rfid in taken_rfids:
+            conflicts[person.nisit] = f"รหัส RFID {person.rfid} ซ้ำกับคนอื่น"
+        else:
+            if person.seat:
+                taken_seats.add(person.seat)
+            if person.rfid:
+                taken_rfids.add(person.rfid)
+    return conflicts
+
+
+def import_persons(dataset):
+    """นำเข้ารายชื่อจาก Dataset แบบ bulk คืนค่า totals {'new', 'update'} จำนวนแถว
+
+    ใช้คอลัมน์และการตรวจแถวเดียวกับ PersonResource (รหัสนิสิตเป็นคีย์) แต่ดึงคนที่มีอยู่แล้ว
+    ด้วย query เดียว จองที่นั่งทีละช่วง แล้วเขียนด้วย bulk_create/bulk_update ทีละ IMPORT_BATCH_SIZE แถว
+    ถ้ามีแถวที่ค่าไม่ถูกต้อง หรือที่นั่ง/RFID ซ้ำกับคนอื่น จะ raise ImportRowsError โดยไม่บันทึกแถวใดเลย
+    """
+    resource = PersonResource()
+    columns = {name: resource.fields[name].column_name for name in IMPORT_FIELDS}
+    headers = set(dataset.headers or [])
+    if columns['nisit'] not in headers:
+        raise ValueError(f"ไม่พบคอลัมน์ '{columns['nisit']}' ในไฟล์")
+    present = [name for name in IMPORT_FIELDS if columns[name] in headers]
+
+    # เติมรหัสนิสิตที่เว้นว่างให้ครบก่อน (สุ่มทั้งไฟล์พร้อมกัน)
+    resource.before_import(dataset)
+
+    totals = Counter(new=0, update=0)
+    errors = []
+    rows = []
+    for number, values in enumerate(dataset, start=1):
+        row = dict(zip(dataset.headers, values))
+        try:
+            resource.before_import_row(row)
+            rows.append((number, {name: _clean(name, row[columns[name]]) for name in present}))
+        except (ValueError, TypeError) as e:
+            errors.append((number, str(e)))
+
+    with transaction.atomic():
+        existing = Person.objects.select_for_update().in_bulk(
+            {row['nisit'] for _, row in rows}, field_name='nisit'
+        )
+        old_status = {nisit: person.current_status for nisit, person in existing.items()}
+        old_rfid = {person.pk: person.rfid for person in existing.values()}
+
+        pending = {}  # nisit -> Person ตามลำดับในไฟล์ แถวที่รหัสซ้ำจะทับแถวก่อนหน้า
+        row_kinds = {}  # nisit -> [(เลขแถว, 'new'|'update')]
+        for number, row in rows:
+            nisit = row['nisit']
+            kind = 'update' if nisit in pending or nisit in existing else 'new'
+            row_kinds.setdefault(nisit, []).append((number, kind))
+            person = pending.get(nisit) or existing.get(nisit) or Person()
+            for name, value in row.items():
+                setattr(person, name, value)
+            if person.verified1 is None:
+                person.verified1 = 0
+            pending[nisit] = person
+
+        conflicts = _unique_conflicts(list(pending.values()))
+        for nisit, kinds in row_kinds.items():
+            if nisit in conflicts:
+                errors.extend((number, conflicts[nisit]) for number, _ in kinds)
+            else:
+                totals.update(kind for _, kind in kinds)
+        if errors:
+            # ยังไม่ได้เขียนอะไร ปฏิเสธทั้งไฟล์เหมือนการนำเข้าทีละแถวผ่าน django-import-export
+            raise ImportRowsError(_row_messages(errors))
+
+        persons = list(pending.values())
+
+        # ที่นั่งที่กำหนดในไฟล์ต้องไม่ถูกจองซ้ำ ส่วนแถวที่ไม่มีที่นั่งจองเป็นช่วงเดียว
+        explicit = [person.seat for person in persons if person.seat]
+        if explicit:
+            SeatCounter.ensure_above(max(explicit))
+        without_seat = [person for person in persons if not person.seat]
+        if without_seat:
+            for person, seat in zip(without_seat, SeatCounter.allocate(len(without_seat))):
+                person.seat = seat
+
+        now = timezone.now()
+        for person in persons:
+            person.current_status, person.status_changed_at = person.latest_status()
+            person.updated_at = now
+
+        created = [person for person in persons if person.pk is None]
+        updated = [person for person in persons if person.pk is not None]
+        batch_size = import_batch_size()
+        try:
+            # อัปเดตก่อน เพื่อให้ที่นั่ง/RFID ที่คนเดิมย้ายออกว่างก่อนคนใหม่จะใช้
+            if updated:
+                fields = [name for name in present if name != 'nisit']
+                fields = list(dict.fromkeys([*fields, 'seat', 'verified1', *DERIVED_FIELDS]))
+                Person.objects.bulk_update(updated, fields, batch_size=batch_size)
+            if created:
+                Person.objects.bulk_create(created, batch_size=batch_size)
+        except IntegrityError as e:
+            # เช่นสองคนในไฟล์สลับที่นั่งกัน ซึ่งตรวจล่วงหน้าไม่ได้
+            raise ValueError(f"ที่นั่งหรือรหัส RFID ซ้ำกับข้อมูลที่มีอยู่: {e}")
+        if any(person.pk is None for person in created):
+            # MySQL ไม่คืน id จาก bulk_create จึงอ่านกลับด้วยรหัสนิสิต
+            ids = dict(
+                Person.objects.filter(nisit__in=[person.nisit for person in created])
+                .values_list('nisit', 'id')
+            )
+            for person in created:
+                person.pk = ids[person.nisit]
+
+        deltas = Counter()
+        entries = {}
+        unbound = []
+        for person in persons:
+            if person.nisit in old_status:
+                deltas[old_status[person.nisit]] -= 1
+            deltas[person.current_status] += 1
+            if person.rfid:
+                entries[person.rfid] = EPCEntry(
+                    person.pk, person.name, person.verified1, person.verified2,
+                    person.verified3, person.current_status,
+                )
+            elif old_rfid.get(person.pk):
+                unbound.append(person.pk)
+        persons_bulk_changed(entries, deltas, unbound)
+
+    return dict(totals)
+
+
+def import_persons_by_row(dataset):
+    """นำเข้าทีละแถวผ่าน PersonResource (django-import-export) ใช้เมื่อปิด IMPORT_BULK_ENABLED
+
+    คืนค่าและ raise แบบเดียวกับ import_persons: แถวใดผิด ทั้งไฟล์ถูก rollback
+    """
+    result = PersonResource().import_data(
+        dataset, dry_run=False, use_transactions=True, rollback_on_validation_errors=True,
+    )
+    if result.base_errors:
+        raise result.base_errors[0].error
+    errors = [(number, row_errors[0].error) for number, row_errors in result.row_errors()]
+    errors += [(row.number, '; '.join(row.error.messages)) for row in result.invalid_rows]
+    if errors:
+        raise ImportRowsError(_row_messages(errors))
+    return {'new': result.totals.get('new', 0), 'update': result.totals.get('update', 0)}
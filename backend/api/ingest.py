@@ -0,0 +1,118 @@
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .broadcaster import stats_broadcaster
+from .rfid import process_tags, broadcast_scan_updates
+
+logger = logging.getLogger(__name__)
+
+
+class ScanQueue:
+    """คิวในโปรเซสสำหรับรับการอ่านแท็กจาก endpoint แบบ async
+
+    request แค่ใส่การอ่านลงคิวแล้วตอบกลับทันที ส่วน writer thread ตัวเดียว
+    จะดึงออกมาเขียนลงฐานข้อมูลครั้งละ batch_size รายการ หรือทุก ๆ flush_ms
+    มิลลิวินาที แล้วแต่อย่างไหนถึงก่อน
+    การอ่านที่ยังค้างในคิวจะหายไปถ้าโปรเซสถูกปิด
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'RFID_INGEST_BATCH_SIZE', 200)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'RFID_INGEST_FLUSH_MS', 20) / 1000
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=getattr(settings, 'RFID_INGEST_QUEUE_SIZE', 10000))
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='rfid-ingest-writer', daemon=True)
+                self._writer.start()
+
+    def put_many(self, reads):
+        """ใส่การอ่าน (epc, scanner_type, scanner_id) ลงคิว คืนค่า False ถ้าคิวเต็ม"""
+        self._ensure_writer()
+        # ตรวจที่ว่างและใส่ทั้งชุดภายใต้ lock เดียวกัน request อื่นจึงแทรกจนคิวเต็มกลางชุดไม่ได้
+        # (writer thread ดึงออกอย่างเดียว ที่ว่างจึงมีแต่เพิ่มขึ้นระหว่างนี้)
+        with self._lock:
+            maxsize = self._queue.maxsize
+            if maxsize and self._queue.qsize() + len(reads) > maxsize:
+                self.rejected += len(reads)
+                return False
+            for read in reads:
+                self._queue.put_nowait(read)
+            self.enqueued += len(reads)
+        return True
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                write_batch(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("RFID ingest batch failed (%s reads)", len(batch))
+            finally:
+                close_old_connections()
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'rejected': self.rejected,
+            'failed': self.failed,
+        }
+
+
+def write_batch(reads):
+    # แยกตามเครื่องอ่าน (scanner_type, scanner_id) โดยคงลำดับการอ่านไว้
+    groups = {}
+    for epc, scanner_type, scanner_id in reads:
+        groups.setdefault((scanner_type, scanner_id), []).append({'epc': epc})
+
+    changed = False
+    for (scanner_type, scanner_id), tags in groups.items():
+        _, changes = process_tags(tags, scanner_type, scanner_id)
+        if changes:
+            broadcast_scan_updates(changes, scanner_type)
+            changed = True
+
+    if changed:
+        stats_broadcaster.mark_dirty()
+
+
+scan_queue = ScanQueue()
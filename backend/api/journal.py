@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Person, ScanEvent
+from .stats import refresh_current_status, stats_counter
+from .versioning import person_data_changed
+
+
+def event_batch_size():
+    return getattr(settings, 'RFID_EVENT_BATCH_SIZE', 500)
+
+
+def record_scan_events(events):
+    """ต่อท้าย ScanEvent หลายรายการด้วย bulk_create (แบ่งชุดตาม RFID_EVENT_BATCH_SIZE)"""
+    if events:
+        ScanEvent.objects.bulk_create(events, batch_size=event_batch_size())
+
+
+def rebuild_projection(dry_run=False):
+    """คำนวณ verified1..3 / verified_updated_at1..3 ของ Person ใหม่จาก ScanEvent
+
+    ใช้เหตุการณ์ล่าสุดของแต่ละ (person, scanner_id) ส่วนช่องที่ไม่มีเหตุการณ์จะไม่ถูกแตะ
+    คืนค่าจำนวนแถวที่ถูกเขียนทับ
+    """
+    from .rfid import scan_value
+
+    latest_ids = (
+        ScanEvent.objects.filter(person__isnull=False)
+        .values('person_id', 'scanner_id')
+        .annotate(last_id=Max('id'))
+        .values_list('last_id', flat=True)
+    )
+    events = ScanEvent.objects.filter(id__in=list(latest_ids)).values_list(
+        'person_id', 'scanner_id', 'direction', 'timestamp'
+    )
+
+    existing = set(Person.objects.values_list('id', flat=True))
+    by_scanner = {1: [], 2: [], 3: []}
+    for person_id, scanner_id, direction, timestamp in events.iterator():
+        if person_id not in existing or scanner_id not in by_scanner:
+            continue
+        by_scanner[scanner_id].append(Person(id=person_id, **{
+            f'verified{scanner_id}': scan_value(direction),
+            f'verified_updated_at{scanner_id}': timestamp,
+        }))
+
+    total = sum(len(rows) for rows in by_scanner.values())
+    if dry_run:
+        return total
+
+    now = timezone.now()
+    with transaction.atomic():
+        for scanner_id, rows in by_scanner.items():
+            if rows:
+                for row in rows:
+                    row.updated_at = now  # bulk_update ไม่ตั้ง auto_now ให้
+                Person.objects.bulk_update(
+                    rows,
+                    [f'verified{scanner_id}', f'verified_updated_at{scanner_id}', 'updated_at'],
+                    batch_size=event_batch_size(),
+                )
+        refresh_current_status(Person.objects.all())
+        transaction.on_commit(stats_counter.reseed)
+        transaction.on_commit(person_data_changed)
+    return total
@@ -0,0 +1,84 @@
+import gzip
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONRenderer, orjson
+from api.middleware import brotli
+from api.serializers import PERSON_ROW_FIELDS, person_rows
+
+FIRST_NAMES = ['สมชาย', 'สมหญิง', 'ธนพล', 'กมลวรรณ', 'ปิยะพงษ์', 'วรรณวิสา', 'ณัฐพงศ์', 'ศิริพร']
+LAST_NAMES = ['ใจดี', 'รักเรียน', 'ศรีสุข', 'วงศ์ใหญ่', 'ทองคำ', 'บุญมา', 'แสงทอง', 'พึ่งบุญ']
+DEGREES = ['วิทยาศาสตรบัณฑิต', 'ครุศาสตรบัณฑิต', 'บริหารธุรกิจบัณฑิต', 'วิทยาศาสตรมหาบัณฑิต', 'ปรัชญาดุษฎีบัณฑิต']
+
+
+class Command(BaseCommand):
+    help = (
+        "วัดเวลา render JSON ของรายชื่อ N คน (DRF JSONRenderer เทียบกับ FastJSONRenderer) "
+        "และขนาดข้อมูลเมื่อบีบอัดด้วย gzip/brotli ใช้ข้อมูลสุ่มในหน่วยความจำ ไม่แตะฐานข้อมูล"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=10000, help='จำนวนแถว (default 10000)')
+        parser.add_argument('--repeat', type=int, default=5, help='วัดกี่รอบแล้วใช้ค่าที่เร็วที่สุด')
+
+    def handle(self, *args, **options):
+        data = person_rows(self.fake_values(options['persons']))
+
+        renderers = [('drf', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("ไม่ได้ติดตั้ง orjson FastJSONRenderer จะใช้ JSONRenderer ของ DRF"))
+
+        body = None
+        for name, renderer in renderers:
+            best, body = self.measure(lambda: renderer.render(data), options['repeat'])
+            self.stdout.write(f"render {name:<7}: {best * 1000:8.1f} ms  {len(body):>10,} bytes")
+
+        encoders = [('gzip', lambda raw: gzip.compress(raw, compresslevel=6))]
+        if brotli is not None:
+            encoders.append(('br q4', lambda raw: brotli.compress(raw, quality=4)))
+        else:
+            self.stdout.write(self.style.WARNING("ไม่ได้ติดตั้ง brotli วัดเฉพาะ gzip"))
+
+        for name, encode in encoders:
+            best, compressed = self.measure(lambda: encode(body), options['repeat'])
+            ratio = len(compressed) / len(body) * 100
+            self.stdout.write(f"{name:<13}: {best * 1000:8.1f} ms  {len(compressed):>10,} bytes ({ratio:.1f}%)")
+
+    def measure(self, func, repeat):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def fake_values(self, count):
+        # แถวในรูปแบบเดียวกับ person_values() เพื่อให้ได้ payload เหมือน /api/person/?all=true
+        rng = random.Random(0)
+        now = timezone.now()
+        for i in range(count):
+            scanned = [rng.random() < 0.6 for _ in range(3)]
+            row = dict.fromkeys(PERSON_ROW_FIELDS)
+            row.update({
+                'id': i + 1,
+                'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                'nisit': f"{rng.randrange(10 ** 10, 10 ** 11)}",
+                'degree': rng.choice(DEGREES),
+                'seat': i + 1,
+                'read_flag': False,
+                'read_light': False,
+                'date': now - timedelta(days=3, seconds=i),
+                'rfid': f"E280{rng.getrandbits(64):016X}" if rng.random() < 0.8 else None,
+                'current_status': 0,
+                'updated_at': now,
+            })
+            for slot, done in enumerate(scanned, start=1):
+                row[f'verified{slot}'] = rng.choice([1, 2]) if done else 0
+                row[f'verified_updated_at{slot}'] = now - timedelta(seconds=rng.randrange(7200)) if done else None
+            yield row
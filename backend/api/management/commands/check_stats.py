@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from api.stats import count_statuses, format_stats, stats_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "เทียบตัวนับสถิติ (ตาราง SharedCounter ที่เซิร์ฟเวอร์ใช้) กับการนับใหม่ทั้งตาราง "
+        "(--fix เพื่อตั้งค่าใหม่)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='นับใหม่และเขียนทับตัวนับ')
+
+    def handle(self, *args, **options):
+        stored = stats_counter.read()
+        actual = count_statuses()
+
+        if stored is None:
+            self.stdout.write("ตัวนับยังไม่ถูกตั้งต้น")
+        else:
+            drift = {
+                status: stored.get(status, 0) - actual.get(status, 0)
+                for status in stats_counter.STATUSES
+                if stored.get(status, 0) != actual.get(status, 0)
+            }
+            self.stdout.write(f"stored: {format_stats(stored)}")
+            self.stdout.write(f"actual: {format_stats(actual)}")
+            if drift:
+                self.stdout.write(self.style.WARNING(f"คลาดเคลื่อน (stored - actual): {drift}"))
+            else:
+                self.stdout.write(self.style.SUCCESS("ตัวนับตรงกับฐานข้อมูล"))
+
+        if options['fix']:
+            stats_counter.reseed()
+            self.stdout.write(self.style.SUCCESS("ตั้งค่าตัวนับใหม่แล้ว"))
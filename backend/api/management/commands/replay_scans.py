@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api.journal import rebuild_projection
+
+
+class Command(BaseCommand):
+    help = (
+        "คำนวณสถานะ verified1..3 ของ Person ใหม่จากประวัติการสแกน (ScanEvent) "
+        "หมายเหตุ: การแก้สถานะด้วยมือจากหน้าเว็บไม่อยู่ใน ScanEvent และจะถูกเขียนทับในช่องที่มีการสแกน"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='นับจำนวนที่จะเปลี่ยนโดยไม่เขียนลงฐานข้อมูล')
+
+    def handle(self, *args, **options):
+        total = rebuild_projection(dry_run=options['dry_run'])
+        verb = 'จะเขียนทับ' if options['dry_run'] else 'เขียนทับแล้ว'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} ช่องสถานะจาก ScanEvent"))
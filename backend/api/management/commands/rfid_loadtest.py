@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from api.models import Person, ScanEvent, SeatCounter
+from api.stats import stats_counter
+from api.versioning import person_data_changed
+
+EPC_PREFIX = 'LOADTEST'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Command(BaseCommand):
+    help = (
+        "สร้างข้อมูลทดสอบ N คนพร้อม EPC แล้วยิงชุดแท็กไปที่ RFIDSimulator "
+        "ตามอัตราและจำนวน concurrent ที่กำหนด รายงาน throughput, latency p50/p95/p99 "
+        "และจำนวน query ต่อ request (เฉพาะโหมดในโปรเซส)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--persons', type=int, default=1000, help='จำนวนคนที่จะสร้าง (default 1000)')
+        parser.add_argument('--skip-seed', action='store_true', help='ใช้คนที่สร้างไว้แล้วจากรอบก่อน')
+        parser.add_argument('--cleanup', action='store_true', help='ลบคนที่สร้างเมื่อจบการทดสอบ')
+        parser.add_argument('--requests', type=int, default=500, help='จำนวน request ทั้งหมด')
+        parser.add_argument('--burst', type=int, default=20, help='จำนวนแท็กต่อ request')
+        parser.add_argument('--concurrency', type=int, default=4, help='จำนวน request ที่ยิงพร้อมกัน')
+        parser.add_argument('--rate', type=float, default=0, help='request ต่อวินาทีรวมทุกเครื่อง (0 = เร็วที่สุด)')
+        parser.add_argument('--scanner-id', type=int, choices=[1, 2, 3], default=None, help='ค่าเริ่มต้นคือสุ่ม 1-3')
+        parser.add_argument('--scanner-type', choices=['in', 'out'], default=None, help='ค่าเริ่มต้นคือสุ่ม')
+        parser.add_argument('--path', default='/api/rfidAPI/', help='path ของ endpoint (โหมดในโปรเซส)')
+        parser.add_argument('--url', default=None, help='ยิงผ่าน HTTP ไปที่ URL นี้แทนการเรียกในโปรเซส')
+        parser.add_argument('--seed', type=int, default=None, help='random seed')
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
+        if not options['skip_seed']:
+            self.seed_persons(options['persons'])
+        epcs = list(
+            Person.objects.filter(rfid__startswith=EPC_PREFIX).values_list('rfid', flat=True)
+        )
+        if not epcs:
+            raise CommandError('ไม่มีข้อมูลทดสอบ ลองรันโดยไม่ใส่ --skip-seed')
+
+        try:
+            self.run(epcs, options)
+        finally:
+            if options['cleanup']:
+                deleted, _ = Person.objects.filter(rfid__startswith=EPC_PREFIX).delete()
+                ScanEvent.objects.filter(epc__startswith=EPC_PREFIX).delete()
+                self.stdout.write(f"ลบข้อมูลทดสอบ {deleted} แถว")
+
+    def seed_persons(self, count):
+        Person.objects.filter(rfid__startswith=EPC_PREFIX).delete()
+
+        # bulk_create ไม่ผ่าน Person.save จึงกำหนด seat และ nisit เอง
+        nisits = [f"99{i:09d}" for i in range(count)]
+        taken = set(Person.objects.filter(nisit__in=nisits).values_list('nisit', flat=True))
+        if taken:
+            raise CommandError(f"รหัสนิสิตทดสอบชนกับข้อมูลจริง {len(taken)} รายการ")
+        seats = SeatCounter.allocate(count)
+
+        Person.objects.bulk_create(
+            [
+                Person(
+                    name=f"{EPC_PREFIX} {i:06d}",
+                    nisit=nisits[i],
+                    degree='วิทยาศาสตรบัณฑิต',
+                    seat=seats[i],
+                    rfid=f"{EPC_PREFIX}{i:08d}",
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+        stats_counter.reseed()  # bulk_create ไม่ส่ง signal
+        person_data_changed()
+        self.stdout.write(f"สร้างข้อมูลทดสอบ {count} คน")
+
+    def run(self, epcs, options):
+        total = options['requests']
+        burst = min(options['burst'], len(epcs))
+        rate = options['rate']
+        url = options['url']
+
+        payloads = [
+            {
+                'tags': [{'epc': epc} for epc in random.sample(epcs, burst)],
+                'scanner_type': options['scanner_type'] or random.choice(['in', 'out']),
+                'scanner_id': options['scanner_id'] or random.randint(1, 3),
+            }
+            for _ in range(total)
+        ]
+
+        local = threading.local()
+        started = time.perf_counter()
+
+        def fire(i):
+            if rate > 0:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if url:
+                return self.send_http(url, payloads[i])
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            close_old_connections()
+            return self.send_local(local.client, options['path'], payloads[i])
+
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                samples = list(pool.map(fire, range(total)))
+        elapsed = time.perf_counter() - started
+
+        self.report(samples, elapsed, burst, local_mode=not url)
+
+    def send_local(self, client, path, payload):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.post(path, payload, content_type='application/json')
+            latency = time.perf_counter() - start
+        return latency, response.status_code < 400, len(queries.captured_queries)
+
+    def send_http(self, url, payload):
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                ok = response.status < 400
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok, None
+
+    def report(self, samples, elapsed, burst, local_mode):
+        latencies = sorted(latency * 1000 for latency, _, _ in samples)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        completed = len(samples)
+
+        self.stdout.write(f"requests      : {completed} (error {errors})")
+        self.stdout.write(f"elapsed       : {elapsed:.2f} s")
+        self.stdout.write(f"throughput    : {completed / elapsed:.1f} req/s, {completed * burst / elapsed:.1f} tags/s")
+        self.stdout.write(
+            f"latency (ms)  : p50 {percentile(latencies, 50):.1f}  "
+            f"p95 {percentile(latencies, 95):.1f}  "
+            f"p99 {percentile(latencies, 99):.1f}  "
+            f"max {latencies[-1] if latencies else 0:.1f}"
+        )
+        if local_mode:
+            queries = sorted(count for _, _, count in samples)
+            self.stdout.write(
+                f"queries/req   : avg {sum(queries) / len(queries):.1f}  "
+                f"p50 {percentile(queries, 50)}  max {queries[-1]}"
+            )
@@ -0,0 +1,105 @@
+import gzip
+import re
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_sequence
+
+try:
+    import brotli
+except ImportError:  # ไม่มี brotli ก็ยังใช้ gzip ได้
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+_accepts = re.compile(r'\b(br|gzip)\b')
+
+
+def _accepted_encodings(request):
+    return set(_accepts.findall(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+async def acompress_sequence(sequence):
+    """compress_sequence() ของ Django สำหรับ iterator แบบ async (response แบบ stream ภายใต้ ASGI)"""
+    buf = StreamingBuffer()
+    with gzip.GzipFile(mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        async for item in sequence:
+            zfile.write(item)
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
+
+
+class APICompressionMiddleware:
+    """บีบอัด response ของ /api/ ด้วย brotli หรือ gzip ตาม Accept-Encoding
+
+    บีบเฉพาะ JSON/ข้อความที่ใหญ่กว่า API_COMPRESS_MIN_BYTES (response แบบ stream ใช้ gzip)
+    ไฟล์ PDF/Excel ที่บีบอัดอยู่แล้วจะไม่ถูกแตะ
+    """
+
+    # รองรับทั้ง WSGI และ ASGI ไม่ให้ Django ต้องห่อ middleware นี้ด้วย async_to_sync/sync_to_async
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @property
+    def min_bytes(self):
+        return getattr(settings, 'API_COMPRESS_MIN_BYTES', 1024)
+
+    @property
+    def brotli_quality(self):
+        return getattr(settings, 'API_COMPRESS_BROTLI_QUALITY', 4)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if not request.path.startswith('/api/') or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = _accepted_encodings(request)
+
+        if response.streaming:
+            if 'gzip' not in accepted:
+                return response
+            if response.is_async:
+                response.streaming_content = acompress_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+            encoding = 'gzip'
+        else:
+            if len(response.content) < self.min_bytes:
+                return response
+            if 'br' in accepted and brotli is not None:
+                compressed, encoding = brotli.compress(response.content, quality=self.brotli_quality), 'br'
+            elif 'gzip' in accepted:
+                compressed, encoding = gzip.compress(response.content, compresslevel=6), 'gzip'
+            else:
+                return response
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # เนื้อหาที่ส่งไม่ตรงกับ ETag เดิมแบบ byte ต่อ byte แล้ว (แบบเดียวกับ GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
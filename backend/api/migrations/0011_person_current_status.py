@@ -0,0 +1,67 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:44
+
+from datetime import datetime, timezone
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+
+# สำเนาของกฎใน api.stats ณ ตอนสร้าง migration (ไม่ import โค้ดของแอปที่อาจเปลี่ยนภายหลัง)
+VALID_STATUSES = [0, 1, 2]
+INVALID_TIME = datetime(1900, 1, 1, tzinfo=timezone.utc)
+MISSING_TIME = datetime(1900, 1, 2, tzinfo=timezone.utc)
+
+
+def _slot_time(i):
+    return Case(
+        When(**{f'verified{i}__in': VALID_STATUSES}, then=Coalesce(F(f'verified_updated_at{i}'), Value(MISSING_TIME))),
+        default=Value(INVALID_TIME),
+        output_field=models.DateTimeField(),
+    )
+
+
+def _latest_slot_case(field_prefix, default, output_field):
+    # ช่องที่เวลาล่าสุดชนะ เวลาเท่ากันให้ช่องที่เลขน้อยกว่าชนะ ช่องที่ค่าไม่อยู่ใน 0-2 ไม่นับ
+    t1, t2, t3 = _slot_time(1), _slot_time(2), _slot_time(3)
+    valid = {i: Q(**{f'verified{i}__in': VALID_STATUSES}) for i in (1, 2, 3)}
+    return Case(
+        When(valid[1] & Q(GreaterThanOrEqual(t1, t2)) & Q(GreaterThanOrEqual(t1, t3)), then=F(f'{field_prefix}1')),
+        When(valid[2] & Q(GreaterThanOrEqual(t2, t3)), then=F(f'{field_prefix}2')),
+        When(valid[3], then=F(f'{field_prefix}3')),
+        default=default,
+        output_field=output_field,
+    )
+
+
+def backfill_current_status(apps, schema_editor):
+    Person = apps.get_model('api', 'Person')
+    Person.objects.update(
+        current_status=_latest_slot_case('verified', Value(-1), models.IntegerField()),
+        status_changed_at=_latest_slot_case('verified_updated_at', Value(None), models.DateTimeField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_scanevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='current_status',
+            field=models.IntegerField(blank=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_current_status, migrations.RunPython.noop),
+        # สร้าง index หลัง backfill ไม่ต้องปรับ index ทีละแถวระหว่าง UPDATE ทั้งตาราง
+        migrations.AddIndex(
+            model_name='person',
+            index=models.Index(fields=['current_status', 'seat'], name='person_status_seat_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.13 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_seat_counter(apps, schema_editor):
+    # เริ่มตัวนับต่อจากที่นั่งสูงสุดที่มีอยู่แล้ว
+    Person = apps.get_model('api', 'Person')
+    SeatCounter = apps.get_model('api', 'SeatCounter')
+    last = Person.objects.aggregate(Max('seat'))['seat__max'] or 0
+    SeatCounter.objects.update_or_create(name='seat', defaults={'next_value': last + 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_person_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_seat_counter, migrations.RunPython.noop),
+    ]
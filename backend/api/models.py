@@ -1,7 +1,18 @@
+from django.conf import settings
 from django.db import models, transaction
+from django.db.models import Case, F, Max, Value, When
 from django.utils import timezone
 from django.contrib.auth.models import User
+from datetime import datetime, timedelta, timezone as dt_timezone
 import random
+import string
+
+# ค่าสถานะที่ใช้ได้: 0 = ยังไม่รายงานตัว, 1 = รายงานตัวแล้ว, 2 = อยู่ในห้องพิธี
+VALID_STATUSES = [0, 1, 2]
+STATUS_SOURCE_FIELDS = {
+    'verified1', 'verified2', 'verified3',
+    'verified_updated_at1', 'verified_updated_at2', 'verified_updated_at3',
+}
 
 class Person(models.Model):
     name = models.CharField(max_length=100)
@@ -23,25 +34,96 @@ class Person(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     rfid = models.CharField(max_length=25, unique=True, blank=True, null=True)  
 
+    # สถานะล่าสุดจาก verified1..3 (ดู latest_status) เก็บไว้เพื่อให้ query/นับผ่าน index ได้
+    # (ใช้ index person_status_seat_idx ซึ่งขึ้นต้นด้วย current_status)
+    current_status = models.IntegerField(default=0, blank=True)
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+
+    # เวลาที่แถวเปลี่ยนล่าสุด ใช้กับ /api/person/changes/ (การเขียนแบบ bulk ต้องกำหนดเอง)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # index สำหรับตัวกรองของ /api/person/ (ดู api/filters.py)
+        # ค่าที่ใช้กรองอยู่หน้า seat เพื่อให้ทั้ง WHERE และการเรียงตามที่นั่งใช้ index เดียวกัน
+        indexes = [
+            models.Index(fields=['name'], name='person_name_idx'),
+            models.Index(fields=['degree', 'seat'], name='person_degree_seat_idx'),
+            models.Index(fields=['current_status', 'seat'], name='person_status_seat_idx'),
+            models.Index(fields=['verified1', 'seat'], name='person_verified1_seat_idx'),
+            models.Index(fields=['verified2', 'seat'], name='person_verified2_seat_idx'),
+            models.Index(fields=['verified3', 'seat'], name='person_verified3_seat_idx'),
+        ]
+
     @staticmethod
     def generate_unique_value(length, model, field):
-        while True:
-            value = ''.join([str(random.randint(0, 9)) for _ in range(length)])
-            if not model.objects.filter(**{field: value}).exists():
-                return value
+        return Person.generate_unique_values(1, length, model, field)[0]
+
+    @staticmethod
+    def generate_unique_values(count, length, model, field, exclude=(), batch_size=1000):
+        """สุ่มตัวเลขยาว length หลักที่ไม่ซ้ำกัน count ค่า
+
+        ตรวจการชนกับฐานข้อมูลด้วย field__in ทีละไม่เกิน batch_size ค่า แล้วสุ่มใหม่เฉพาะตัวที่ชน
+        exclude คือค่าที่ถูกใช้แล้วแต่ยังไม่อยู่ในฐานข้อมูล (เช่นรหัสอื่นในไฟล์นำเข้าเดียวกัน)
+        """
+        taken = set(exclude)
+        values = []
+        while len(values) < count:
+            candidates = set()
+            while len(candidates) < min(count - len(values), batch_size):
+                value = ''.join(random.choices(string.digits, k=length))
+                if value not in taken:
+                    candidates.add(value)
+            taken |= candidates
+            collisions = model.objects.filter(**{f'{field}__in': candidates}).values_list(field, flat=True)
+            values.extend(candidates.difference(collisions))
+        return values
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # จำสถานะตอนโหลด เพื่อให้ signal รู้ว่าสถานะเปลี่ยนจากอะไรเป็นอะไร (ดู api/signals.py)
+        instance._loaded_status = instance.__dict__.get('current_status')
+        instance._loaded_seat = instance.__dict__.get('seat')
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.nisit:
             self.nisit = self.generate_unique_value(11, Person, 'nisit')
 
         if not self.seat:
-            with transaction.atomic():
-                # Lock the table to prevent concurrent updates
-                last_person = Person.objects.select_for_update().order_by('-seat').first()
-                self.seat = last_person.seat + 1 if last_person else 1
+            # จองที่นั่งจากตัวนับ ไม่ต้องล็อกแถว seat สูงสุดของตาราง
+            self.seat = SeatCounter.allocate()[0]
+        elif self._state.adding or self.seat != getattr(self, '_loaded_seat', None):
+            # ที่นั่งที่กำหนดเองต้องไม่ถูกจองซ้ำในภายหลัง
+            SeatCounter.ensure_above(self.seat)
         
+        self.current_status, self.status_changed_at = self.latest_status()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and STATUS_SOURCE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'current_status', 'status_changed_at'}
+
         super().save(*args, **kwargs)
 
+    def latest_status(self):
+        """คืนค่า (สถานะ, เวลา) ของช่อง verified1..3 ที่อัปเดตล่าสุด
+
+        ช่องที่ค่าไม่อยู่ใน 0-2 ไม่นับ ช่องที่ไม่มีเวลาถือว่าเก่าที่สุด
+        และเวลาเท่ากันให้ช่องที่เลขน้อยกว่าชนะ ถ้าไม่มีช่องที่ใช้ได้คืนค่า (-1, None)
+        กฎเดียวกับ api.stats.latest_status_expression() ที่ใช้ใน SQL
+        """
+        latest = None
+        for i in (1, 2, 3):
+            value = getattr(self, f'verified{i}')
+            if value not in VALID_STATUSES:
+                continue
+            changed_at = getattr(self, f'verified_updated_at{i}')
+            sort_key = changed_at or datetime.min.replace(tzinfo=dt_timezone.utc)
+            if latest is None or sort_key > latest[0]:
+                latest = (sort_key, value, changed_at)
+        if latest is None:
+            return -1, None
+        return latest[1], latest[2]
+
     def display_id(self):   
         return str(self.id).zfill(4)
 
@@ -56,6 +138,102 @@ class Person(models.Model):
             f"เมื่อ {local_date.strftime('%d/%m/%Y %H:%M:%S')}"
         )
 
+class SeatCounter(models.Model):
+    """ตัวนับสำหรับแจกเลขที่นั่ง (แถวละชื่อ) จองได้ทีละหลายที่ในคำสั่งเดียว
+
+    next_value คือเลขถัดไปที่ยังไม่ถูกจอง ถ้ายังไม่มีแถวหรือเพิ่ง reset จะเริ่มจาก max(seat) + 1
+    """
+    SEAT = 'seat'
+
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    @classmethod
+    def allocate(cls, count=1, name=SEAT, field='seat'):
+        """จอง count ที่ติดกัน คืนค่า range ของเลขที่จองได้ field คือฟิลด์ของ Person ที่ใช้หาเลขเริ่มต้น"""
+        with transaction.atomic():
+            # UPDATE ล็อกแถวตัวนับไว้จนจบ transaction ผู้จองพร้อมกันจึงได้ช่วงที่ไม่ซ้ำกัน
+            if not cls.objects.filter(name=name).update(next_value=F('next_value') + count):
+                cls._seed(name, field)
+                cls.objects.filter(name=name).update(next_value=F('next_value') + count)
+            end = cls.objects.filter(name=name).values_list('next_value', flat=True).get()
+        return range(end - count, end)
+
+    @classmethod
+    def ensure_above(cls, value, name=SEAT):
+        # ถ้ามีการใช้เลขที่สูงกว่าตัวนับ (เช่นกำหนดที่นั่งเองหรือนำเข้าไฟล์) ให้ตัวนับข้ามไปหลังเลขนั้น
+        # ก่อน save ค่าอาจยังเป็นข้อความ (เช่นจาก django-import-export)
+        value = int(value)
+        cls.objects.filter(name=name, next_value__lte=value).update(next_value=value + 1)
+
+    @classmethod
+    def reset(cls, name=SEAT, field='seat'):
+        # ตั้งค่าแถวเดิมใหม่เป็น max(field) + 1 แทนการลบ ผู้จองหลังจากนี้จึงรอล็อกแถวเดียวกันเสมอ
+        with transaction.atomic():
+            if not cls.objects.filter(name=name).update(next_value=cls._first_free(field)):
+                cls._seed(name, field)
+
+    @classmethod
+    def _seed(cls, name, field):
+        # สร้างแถวก่อนแล้วค่อยอ่าน max(field) ขณะถือล็อกแถวที่เพิ่ง INSERT
+        # อีก transaction ที่สร้างชื่อเดียวกันจะรอจน commit แล้วได้แถวนี้ไปแทน (ไม่ seed ซ้ำ)
+        counter, created = cls.objects.get_or_create(name=name)
+        if created:
+            cls.objects.filter(pk=counter.pk).update(next_value=cls._first_free(field))
+
+    @staticmethod
+    def _first_free(field):
+        return (Person.objects.aggregate(top=Max(field))['top'] or 0) + 1
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+class SharedCounter(models.Model):
+    """ค่าตัวเลขที่ทุกโปรเซสต้องเห็นตรงกัน (เวอร์ชันข้อมูลสำหรับ ETag และตัวนับสถิติ)
+
+    เก็บในฐานข้อมูลแทน cache เพราะ LocMemCache (ค่าเริ่มต้น) แยกกันในแต่ละโปรเซส
+    ทั้ง worker ของเซิร์ฟเวอร์และคำสั่ง manage.py ที่เขียนข้อมูล Person
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_values(cls, names):
+        # ชื่อที่ยังไม่มีแถวจะไม่อยู่ในผลลัพธ์
+        return dict(cls.objects.filter(name__in=names).values_list('name', 'value'))
+
+    @classmethod
+    def set_values(cls, values):
+        cls.objects.bulk_create(
+            [cls(name=name, value=value, updated_at=timezone.now()) for name, value in values.items()],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['value', 'updated_at'],
+        )
+
+    @classmethod
+    def add(cls, deltas):
+        """บวก delta ให้หลายแถวใน UPDATE เดียว คืนจำนวนแถวที่มีอยู่และถูกบวก"""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        return cls.objects.filter(name__in=deltas).update(
+            value=F('value') + Case(
+                *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+                default=Value(0),
+                output_field=models.BigIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def remove(cls, names):
+        cls.objects.filter(name__in=names).delete()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
 class Log(models.Model):
     ACTION_CHOICES = [
         ('add', 'Add'),
@@ -81,6 +259,45 @@ class Log(models.Model):
     def __str__(self):
         return f"{self.timestamp} - {self.action} - {self.model}"
     
+class ScanEvent(models.Model):
+    # บันทึกการสแกนแบบต่อท้ายอย่างเดียว สถานะ verified1..3 ของ Person เป็นผลที่คำนวณจากตารางนี้
+    DIRECTION_CHOICES = [
+        ('in', 'In'),
+        ('out', 'Out'),
+    ]
+
+    epc = models.CharField(max_length=25)
+    # ไม่ผูก constraint และไม่ลบตาม เพื่อให้ประวัติยังอยู่แม้ลบ Person ไปแล้ว
+    person = models.ForeignKey(Person, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='scan_events')
+    scanner_id = models.PositiveSmallIntegerField()
+    direction = models.CharField(max_length=3, choices=DIRECTION_CHOICES)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.timestamp} - {self.epc} - {self.direction}{self.scanner_id}"
+
+class PersonTombstone(models.Model):
+    # บันทึกการลบ Person เพื่อให้ /api/person/changes/ แจ้งผู้ใช้ที่ซิงก์อยู่ได้
+    # person_id เป็น null = รีเซ็ตฐานข้อมูลทั้งหมด ผู้ใช้ต้องโหลดใหม่ทั้งหมด
+    person_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    @staticmethod
+    def cutoff(now=None):
+        # เก็บไว้ PERSON_TOMBSTONE_RETENTION_HOURS ชั่วโมง token ที่เก่ากว่านี้ต้องโหลดใหม่ทั้งหมด
+        hours = getattr(settings, 'PERSON_TOMBSTONE_RETENTION_HOURS', 24)
+        return (now or timezone.now()) - timedelta(hours=hours)
+
+    @classmethod
+    def record(cls, person_ids):
+        """บันทึกการลบหลายคนด้วย INSERT เดียว และล้าง tombstone ที่เก่ากว่าระยะเก็บไปพร้อมกัน"""
+        now = timezone.now()
+        cls.objects.filter(deleted_at__lt=cls.cutoff(now)).delete()
+        cls.objects.bulk_create([cls(person_id=pk, deleted_at=now) for pk in person_ids], batch_size=1000)
+
+    def __str__(self):
+        return f"{self.deleted_at} - {self.person_id if self.person_id is not None else 'reset'}"
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     nickname = models.CharField(max_length=100, blank=True)
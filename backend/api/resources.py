@@ -38,6 +38,22 @@ class PersonResource(resources.ModelResource):
     def dehydrate_verified(self, person):
         return person.verified1
 
+    def before_import(self, dataset, **kwargs):
+        # สุ่มรหัสนิสิตให้ทุกแถวที่เว้นว่างพร้อมกันทีเดียว แทนที่ Person.save จะสุ่มและ query ทีละแถว
+        header = self.fields['nisit'].column_name
+        if header not in (dataset.headers or []):
+            return
+        column = list(dataset[header])
+        missing = [i for i, value in enumerate(column) if value is None or not str(value).strip()]
+        if not missing:
+            return
+        used = {str(value) for value in column if value is not None}
+        generated = Person.generate_unique_values(len(missing), 11, Person, 'nisit', exclude=used)
+        for i, value in zip(missing, generated):
+            column[i] = value
+        del dataset[header]
+        dataset.append_col(column, header=header)
+
     def before_import_row(self, row, **kwargs):
         value = row.get('สถานะรายงานตัว', '')
         try:
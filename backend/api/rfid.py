@@ -0,0 +1,283 @@
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+from .consumers import broadcast_bulk_update
+from .debounce import scan_debouncer
+from .epc_index import epc_index, EPCEntry, ENTRY_FIELDS, entry_status, entry_with_status
+from .journal import record_scan_events
+from .models import Person, ScanEvent
+from .versioning import persons_bulk_changed
+
+
+SCAN_PAYLOAD_ERROR = 'Missing tags or invalid scanner_type (in/out) or scanner_id (1-3)'
+
+
+def parse_scan_payload(data):
+    """ตรวจ payload ของเครื่องอ่าน คืนค่า (tags, scanner_type, scanner_id) หรือ None ถ้าไม่ถูกต้อง"""
+    tags = data.get('tags', [])
+    scanner_type = data.get('scanner_type')  # 'in' or 'out'
+    scanner_id = data.get('scanner_id')      # 1, 2, or 3
+
+    try:
+        scanner_id = int(scanner_id)
+    except (TypeError, ValueError):
+        scanner_id = None
+
+    if not tags or not isinstance(tags, list) or scanner_type not in ['in', 'out'] or scanner_id not in [1, 2, 3]:
+        return None
+    return tags, scanner_type, scanner_id
+
+
+def scan_value(scanner_type):
+    # เครื่องอ่านขาออก (out) = อยู่ในห้องพิธี (2), ขาเข้า (in) = รายงานตัวแล้ว (1)
+    return 2 if scanner_type == 'out' else 1
+
+
+def resolve_epcs(epcs):
+    """คืนค่า dict epc -> EPCEntry ของ EPC ที่ผูกกับคนแล้ว
+
+    ใช้ดัชนีในหน่วยความจำก่อน แล้วค้นเฉพาะ EPC ที่ไม่อยู่ในดัชนีด้วย query เดียว
+    """
+    if epc_index.enabled:
+        entries, missing = epc_index.lookup(epcs)
+    else:
+        entries, missing = {}, list(epcs)
+
+    if missing:
+        rows = Person.objects.filter(rfid__in=missing).values_list('rfid', *ENTRY_FIELDS)
+        for rfid, *values in rows:
+            entries[rfid] = EPCEntry(*values)
+    return entries
+
+
+def claim_unbound_persons(count):
+    """จองคนที่ยังไม่มี RFID (rfid เป็น NULL ก่อน แล้วค่อย '') ไม่เกิน count คน
+
+    ต้องเรียกภายใน transaction แถวที่ได้จะถูกล็อกไว้จน commit และถ้าฐานข้อมูล
+    รองรับ SKIP LOCKED เครื่องอ่านอื่นจะข้ามแถวที่ถูกจองอยู่ไปเลย ไม่ต้องรอกัน
+    และไม่ได้คนเดียวกัน คืนค่าเป็น tuple ตาม ENTRY_FIELDS
+    """
+    queryset = (
+        Person.objects.filter(Q(rfid__isnull=True) | Q(rfid=''))
+        .order_by(F('rfid').asc(nulls_first=True), 'id')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    elif connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+    return list(queryset.values_list(*ENTRY_FIELDS)[:count])
+
+
+def process_tags(tags, scanner_type, scanner_id):
+    """ประมวลผลแท็กทั้งชุดจากเครื่องอ่านหนึ่งเครื่อง
+
+    ค้นหา EPC ทั้งหมดในครั้งเดียว (ดัชนี + rfid__in) แล้วเขียนสถานะกลับแบบ bulk
+    คืนค่า (results, changes) โดย results เรียงตามลำดับแท็กที่ส่งเข้ามา
+    และ changes เป็นรายการ {'id', 'fields'} ของคนที่สถานะเปลี่ยน
+    """
+    epcs = [tag.get('epc') for tag in tags if tag.get('epc')]
+    if not epcs:
+        return [], []
+
+    # การอ่านซ้ำภายในช่วง debounce ตอบว่าแสกนแล้วโดยไม่แตะฐานข้อมูล
+    accepted = scan_debouncer.accept(epcs, scanner_type, scanner_id)
+    fresh = {epc for epc, ok in zip(epcs, accepted) if ok}
+    if not fresh:
+        return [repeated_result(epc) for epc in epcs], []
+
+    try:
+        try:
+            return _apply_reads(epcs, accepted, fresh, scanner_type, scanner_id)
+        except IntegrityError:
+            # เครื่องอ่านอื่นผูก EPC เดียวกันไปก่อน (rfid ซ้ำ) ลองใหม่ครั้งเดียว
+            # รอบนี้ EPC นั้นจะถูกค้นเจอในฐานข้อมูลแล้ว
+            return _apply_reads(epcs, accepted, fresh, scanner_type, scanner_id)
+    except Exception:
+        scan_debouncer.forget(fresh, scanner_type, scanner_id)
+        raise
+
+
+def repeated_result(epc, entry=None):
+    entry = entry or epc_index.peek(epc)
+    name = entry.name if entry else 'null'
+    return f"rfid: {epc} name: {name} status: แท็กนี้ถูกแสกนแล้ว"
+
+
+def _apply_reads(epcs, accepted, fresh, scanner_type, scanner_id):
+    verified_field = f"verified{scanner_id}"
+    time_field = f"verified_updated_at{scanner_id}"
+    verified_value = scan_value(scanner_type)
+    now = timezone.now()
+
+    # ช่องที่เพิ่งสแกนมีเวลาใหม่ที่สุดเสมอ จึงเป็น current_status ด้วย
+    status_values = {
+        verified_field: verified_value,
+        time_field: now,
+        'current_status': verified_value,
+        'status_changed_at': now,
+        'updated_at': now,  # update()/bulk_update ไม่ตั้ง auto_now ให้
+    }
+
+    results = []
+    changes = {}       # id -> fields ที่เปลี่ยน
+    newly_bound = {}   # id -> epc ที่เพิ่งผูกในชุดนี้
+    events = []        # ScanEvent ของทุกการอ่านที่ผ่าน debounce
+    event_fields = {'scanner_id': scanner_id, 'direction': scanner_type, 'timestamp': now}
+
+    with transaction.atomic():
+        entries = resolve_epcs(fresh)
+        written, refreshed, gone, status_deltas = _write_known_epcs(
+            entries, fresh, scanner_id, verified_value, status_values,
+        )
+
+        # จองคนที่ยังไม่มี RFID ไว้สำหรับ EPC ใหม่ทั้งชุดในครั้งเดียว
+        unknown_count = len(fresh - entries.keys())
+        free_rows = iter(claim_unbound_persons(unknown_count) if unknown_count else [])
+
+        for epc, ok in zip(epcs, accepted):
+            entry = entries.get(epc)
+
+            if not ok:
+                results.append(repeated_result(epc, entry))
+                continue
+
+            if entry is None:
+                row = next(free_rows, None)
+                if row is None:
+                    events.append(ScanEvent(epc=epc, person_id=None, **event_fields))
+                    results.append(f"rfid: {epc} name: null status: ไม่พบข้อมูลในระบบ")
+                    continue
+
+                # แถวที่จองได้ถูกล็อกและอ่านจากฐานข้อมูลในชุดนี้ สถานะเดิมจึงเชื่อได้
+                entry = EPCEntry(*row)
+                status_deltas[entry.current_status] -= 1
+                status_deltas[verified_value] += 1
+                entry = entry_with_status(entry, scanner_id, verified_value)
+                entries[epc] = entry
+                newly_bound[entry.id] = epc
+                events.append(ScanEvent(epc=epc, person_id=entry.id, **event_fields))
+                changes[entry.id] = {'rfid': epc, verified_field: verified_value, time_field: now}
+                results.append(f"epc: {epc} name: {entry.name} status: เพิ่มรหัส RFID สำเร็จและอัปเดตสถานะแล้ว")
+                continue
+
+            events.append(ScanEvent(epc=epc, person_id=entry.id, **event_fields))
+            if epc not in written:
+                results.append(repeated_result(epc, entry))
+                continue
+
+            changes[entry.id] = {verified_field: verified_value, time_field: now}
+            results.append(f"rfid: {epc} name: {entry.name} status: อัปเดตสถานะสำเร็จ")
+
+        # journal อยู่ใน transaction เดียวกับการปรับสถานะบน Person
+        record_scan_events(events)
+
+        if newly_bound:
+            Person.objects.bulk_update(
+                [Person(id=pk, rfid=epc, **status_values) for pk, epc in newly_bound.items()],
+                ['rfid', *status_values],
+            )
+
+        # แถวที่อ่านใหม่จากฐานข้อมูลใช้แก้ดัชนีที่คลาดไปด้วย
+        fixed_entries = {epc: entries[epc] for epc in refreshed if epc in entries}
+        if changes:
+            changed_entries = {epc: entry for epc, entry in entries.items() if entry.id in changes}
+            persons_bulk_changed({**fixed_entries, **changed_entries}, status_deltas, gone)
+        elif fixed_entries or gone:
+            transaction.on_commit(lambda: _fix_index(fixed_entries, gone))
+
+    return results, [{'id': pk, 'fields': fields} for pk, fields in changes.items()]
+
+
+def _write_known_epcs(entries, fresh, scanner_id, verified_value, status_values):
+    """เขียนสถานะของ EPC ที่ผูกกับคนแล้วแบบมีเงื่อนไข
+
+    entries (จากดัชนีหรือฐานข้อมูล) ใช้เป็นแค่สถานะที่คาดไว้ UPDATE จะเลือกเฉพาะแถวที่ EPC
+    สถานะเดิม และค่าในช่องยังตรงกับที่คาด จำนวนแถวที่เปลี่ยนจึงให้ delta ของตัวนับได้ตรง
+    ถ้าจำนวนไม่ครบ (ดัชนีเก่า หรือเครื่องอ่านอื่นเขียนไปก่อน) หรือคาดว่าแสกนซ้ำ จะล็อกและอ่านแถวเหล่านั้นใหม่
+    คืนค่า (written, refreshed, gone, deltas): EPC ที่เปลี่ยนสถานะ, EPC ที่อ่านใหม่จากฐานข้อมูล,
+    id ของคนที่ไม่ได้ถือ EPC นั้นแล้ว และ Counter สถานะ -> จำนวน โดย entries ถูกแก้เป็นค่าหลังเขียน
+    """
+    verified_field = f"verified{scanner_id}"
+    time_field = f"verified_updated_at{scanner_id}"
+    deltas = Counter()
+    written = set()
+    verify = set()
+    expected = {}   # current_status เดิมที่คาดไว้ -> [EPCEntry]
+    for epc in fresh:
+        entry = entries.get(epc)
+        if entry is None:
+            continue
+        if entry_status(entry, scanner_id) == verified_value:
+            verify.add(epc)
+        else:
+            expected.setdefault(entry.current_status, []).append((epc, entry))
+
+    # ส่วนใหญ่ทุกคนในชุดมีสถานะเดิมเดียวกัน จึงเป็น UPDATE ครั้งเดียว
+    partial = set()
+    for old_status, group in expected.items():
+        count = (
+            Person.objects
+            .filter(id__in=[entry.id for _, entry in group], rfid__in=[epc for epc, _ in group],
+                    current_status=old_status)
+            .exclude(**{verified_field: verified_value})
+            .update(**status_values)
+        )
+        deltas[old_status] -= count
+        deltas[verified_value] += count
+        epcs = [epc for epc, _ in group]
+        if count == len(group):
+            written.update(epcs)
+        else:
+            partial.update(epcs)
+            verify.update(epcs)
+
+    if not verify:
+        for epc in written:
+            entries[epc] = entry_with_status(entries[epc], scanner_id, verified_value)
+        return written, set(), [], deltas
+
+    queryset = Person.objects.filter(rfid__in=verify)
+    if connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+    rows = queryset.values_list('rfid', *ENTRY_FIELDS, time_field)
+
+    pending = []
+    found = {}
+    for rfid, *values, scanned_at in rows:
+        entry = EPCEntry(*values)
+        if entry_status(entry, scanner_id) != verified_value:
+            pending.append((rfid, entry))
+        elif rfid in partial and scanned_at == status_values[time_field]:
+            # ถูกเขียนไปแล้วโดย UPDATE ด้านบน (นับ delta ไปแล้ว)
+            written.add(rfid)
+        found[rfid] = entry
+
+    if pending:
+        # แถวถูกล็อกและเพิ่งอ่านมา สถานะเดิมจึงเป็นค่าจริง
+        Person.objects.filter(id__in=[entry.id for _, entry in pending]).update(**status_values)
+        for rfid, entry in pending:
+            deltas[entry.current_status] -= 1
+            deltas[verified_value] += 1
+            written.add(rfid)
+
+    # EPC ที่ดัชนีคิดว่าผูกอยู่แต่ไม่มีในฐานข้อมูลแล้ว (ถูกลบ/รีเซ็ต) ให้ไปจองคนใหม่เหมือน EPC ใหม่
+    gone = [entries.pop(epc).id for epc in verify - found.keys()]
+    entries.update(found)
+    for epc in written:
+        entries[epc] = entry_with_status(entries[epc], scanner_id, verified_value)
+    return written, set(found), gone, deltas
+
+
+def _fix_index(entries, unbound_ids):
+    for pk in unbound_ids:
+        epc_index.remove_person(pk)
+    epc_index.store(entries)
+
+
+def broadcast_scan_updates(changes, scanner_type):
+    # ส่งเฉพาะฟิลด์ที่เปลี่ยน หน้าเว็บจะนำไปรวมกับข้อมูลเดิมของแถวนั้นเอง
+    if not settings.USE_CHANNEL or not changes:
+        return
+    broadcast_bulk_update(changes, scanner_type=scanner_type)
@@ -9,6 +9,7 @@ class PersonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Person
         fields = '__all__'
+        read_only_fields = ['current_status', 'status_changed_at']
 
     def update(self, instance, validated_data):
         for i in range(1, 4):
@@ -24,27 +25,8 @@ class PersonSerializer(serializers.ModelSerializer):
         return instance
 
     def get_verified(self, obj):
-        latest_verified = None
-        latest_time = None
-
-        # เช็กจาก timestamp ก่อน
-        for i in range(1, 4):
-            verified_value = getattr(obj, f'verified{i}')
-            updated_time = getattr(obj, f'verified_updated_at{i}')
-            if updated_time:
-                if latest_time is None or updated_time > latest_time:
-                    latest_time = updated_time
-                    latest_verified = verified_value
-
-        # ถ้าไม่มี timestamp เลย (null หมด)
-        if latest_verified is None:
-            for i in range(1, 4):
-                verified_value = getattr(obj, f'verified{i}')
-                if verified_value is not None:
-                    return verified_value
-            return None
-
-        return latest_verified
+        # สถานะล่าสุดคำนวณไว้แล้วตอนบันทึก (ดู Person.latest_status)
+        return obj.current_status
 
     def validate_nisit(self, value):
         if Person.objects.filter(nisit=value).exclude(id=self.instance.id if self.instance else None).exists():
@@ -76,4 +58,69 @@ class LogSerializer(serializers.ModelSerializer):
     class Meta:
         model = Log
         fields = '__all__'
-        
\ No newline at end of file
+
+
+# ทางอ่านแบบเบาสำหรับรายการ Person: ดึงด้วย values() แล้วจัดรูปเอง ไม่ผ่าน ModelSerializer ทีละแถว
+# ผลลัพธ์เหมือน PersonSerializer แต่ไม่มี _original
+PERSON_ROW_FIELDS = [
+    'id', 'name', 'nisit', 'degree', 'seat',
+    'verified1', 'verified2', 'verified3',
+    'verified_updated_at1', 'verified_updated_at2', 'verified_updated_at3',
+    'read_flag', 'read_light', 'date', 'rfid',
+    'current_status', 'status_changed_at', 'updated_at',
+]
+PERSON_DATETIME_FIELDS = [
+    'verified_updated_at1', 'verified_updated_at2', 'verified_updated_at3',
+    'date', 'status_changed_at', 'updated_at',
+]
+
+
+def _iso_datetime(value, tz):
+    # รูปแบบเดียวกับ serializers.DateTimeField (ISO 8601 ตาม timezone ปัจจุบัน, UTC ใช้ Z) แต่เร็วกว่ามาก
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def person_values(queryset):
+    return queryset.values(*PERSON_ROW_FIELDS)
+
+
+def person_rows(values):
+    """แปลง dict จาก person_values() เป็นรูปแบบเดียวกับ PersonSerializer (verified = current_status)"""
+    tz = timezone.get_current_timezone()
+    rows = []
+    for value in values:
+        for field in PERSON_DATETIME_FIELDS:
+            if value[field] is not None:
+                value[field] = _iso_datetime(value[field], tz)
+        rows.append({'id': value['id'], 'verified': value['current_status'], **value})
+    return rows
+
+
+def person_to_dict(person):
+    return {
+        'name': person.name,
+        'nisit': person.nisit,
+        'degree': person.degree,
+        'seat': person.seat,
+        'verified1': person.verified1,
+        'verified2': person.verified2,
+        'verified3': person.verified3,
+        'verified_updated_at1': datetime_to_str(person.verified_updated_at1),
+        'verified_updated_at2': datetime_to_str(person.verified_updated_at2),
+        'verified_updated_at3': datetime_to_str(person.verified_updated_at3),
+        'rfid': person.rfid,
+    }
+
+def datetime_to_str(dt):
+    if dt is None:
+        return None
+    return dt.isoformat()
+
+def convert_datetime_fields(data: dict, fields: list):
+    for f in fields:
+        if f in data and isinstance(data[f], datetime):
+            data[f] = data[f].isoformat()
+    return data
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .epc_index import epc_index, EPCEntry
+from .models import Profile, Person, PersonTombstone
+from .stats import stats_counter
+from .versioning import person_data_changed
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
@@ -9,4 +15,46 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
     else:
         if hasattr(instance, 'profile'):
-            instance.profile.save()
\ No newline at end of file
+            instance.profile.save()
+
+def _index_changed(update):
+    # ปรับดัชนีตามการเขียนของโปรเซสนี้ก่อน แล้วค่อยเลื่อนเวอร์ชัน ดัชนีจึงไม่ต้องโหลดใหม่เพราะการเขียนของตัวเอง
+    def refresh():
+        update()
+        epc_index.advance(person_data_changed())
+    transaction.on_commit(refresh)
+
+# ให้ดัชนี EPC และตัวนับสถิติตรงกับฐานข้อมูลหลัง commit แล้วเท่านั้น
+@receiver(post_save, sender=Person)
+def refresh_epc_index(sender, instance, created, **kwargs):
+    pk, rfid = instance.pk, instance.rfid
+    entry = EPCEntry(pk, instance.name, instance.verified1, instance.verified2, instance.verified3, instance.current_status)
+    _index_changed(lambda: epc_index.set_person(pk, rfid, entry))
+
+    old_status = None if created else getattr(instance, '_loaded_status', None)
+    new_status = instance.current_status
+    instance._loaded_status = new_status
+    if created or (old_status is not None and old_status != new_status):
+        transaction.on_commit(lambda: stats_counter.transition(old_status, new_status))
+
+# การลบหลายแถว (api/bulk.py delete_persons, รีเซ็ตฐานข้อมูล) บันทึก tombstone และปรับดัชนีเองครั้งเดียว
+_bulk_deleting = ContextVar('person_bulk_deleting', default=False)
+
+
+@contextmanager
+def bulk_person_delete():
+    token = _bulk_deleting.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deleting.reset(token)
+
+
+@receiver(post_delete, sender=Person)
+def drop_from_epc_index(sender, instance, **kwargs):
+    if _bulk_deleting.get():
+        return
+    pk, status = instance.pk, instance.current_status
+    PersonTombstone.record([pk])
+    transaction.on_commit(lambda: stats_counter.transition(status, None))
+    _index_changed(lambda: epc_index.remove_person(pk))
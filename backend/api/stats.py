@@ -0,0 +1,298 @@
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, DateTimeField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce, TruncMinute
+from django.utils import timezone
+from django.db.models.lookups import GreaterThanOrEqual
+from .models import Person, ScanEvent, SharedCounter, VALID_STATUSES
+from .versioning import data_version
+
+# ช่องที่ค่าไม่อยู่ใน 0-2 จะไม่ถูกเลือก ส่วนช่องที่ไม่มีเวลาถือว่าเก่าที่สุดในบรรดาช่องที่ใช้ได้
+INVALID_TIME = datetime(1900, 1, 1, tzinfo=dt_timezone.utc)
+MISSING_TIME = datetime(1900, 1, 2, tzinfo=dt_timezone.utc)
+
+
+def _slot_time(i):
+    return Case(
+        When(**{f'verified{i}__in': VALID_STATUSES}, then=Coalesce(F(f'verified_updated_at{i}'), Value(MISSING_TIME))),
+        default=Value(INVALID_TIME),
+        output_field=DateTimeField(),
+    )
+
+
+def _latest_slot_case(field_prefix, default, output_field):
+    # กฎเดียวกับ Person.latest_status(): ช่องที่เวลาล่าสุดชนะ เวลาเท่ากันให้ช่องที่เลขน้อยกว่าชนะ
+    t1, t2, t3 = _slot_time(1), _slot_time(2), _slot_time(3)
+    valid = {i: Q(**{f'verified{i}__in': VALID_STATUSES}) for i in (1, 2, 3)}
+    return Case(
+        When(valid[1] & Q(GreaterThanOrEqual(t1, t2)) & Q(GreaterThanOrEqual(t1, t3)), then=F(f'{field_prefix}1')),
+        When(valid[2] & Q(GreaterThanOrEqual(t2, t3)), then=F(f'{field_prefix}2')),
+        When(valid[3], then=F(f'{field_prefix}3')),
+        default=default,
+        output_field=output_field,
+    )
+
+
+def latest_status_expression():
+    """ค่า verified1..3 ของช่องที่อัปเดตล่าสุด (-1 ถ้าไม่มีช่องที่ใช้ได้)"""
+    return _latest_slot_case('verified', Value(-1), IntegerField())
+
+
+def latest_status_time_expression():
+    """verified_updated_at ของช่องเดียวกับ latest_status_expression()"""
+    return _latest_slot_case('verified_updated_at', Value(None), DateTimeField())
+
+
+def refresh_current_status(queryset):
+    """คำนวณ current_status / status_changed_at ใหม่ในฐานข้อมูลด้วย UPDATE เดียว
+
+    ใช้หลังการเขียน verified1..3 แบบ bulk ที่ไม่ผ่าน Person.save
+    """
+    return queryset.update(
+        current_status=latest_status_expression(),
+        status_changed_at=latest_status_time_expression(),
+    )
+
+
+def count_statuses():
+    """นับจำนวนตาม current_status ใหม่ทั้งหมดด้วย COUNT ... GROUP BY บนคอลัมน์ที่มี index"""
+    rows = (
+        Person.objects.values('current_status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    return {row['current_status']: row['count'] for row in rows}
+
+
+def format_stats(counts):
+    return {
+        'total': sum(counts.values()),
+        'checked_in': counts.get(0, 0),
+        'in_checkin_room': counts.get(1, 0),
+        'in_graduation_room': counts.get(2, 0),
+    }
+
+
+class StatsCounter:
+    """ตัวนับจำนวนคนตาม current_status ที่ปรับทีละ delta เมื่อสถานะเปลี่ยน
+
+    เก็บในตาราง SharedCounter ทุกโปรเซสจึงเห็นค่าเดียวกัน (รวมถึง manage.py check_stats)
+    ตั้งต้นจากการนับทั้งตาราง และนับใหม่ทุก STATS_RECONCILE_SECONDS วินาที
+    เพื่อแก้ค่าที่คลาดไป เช่นจาก transaction ที่ rollback หรือการเขียนที่ไม่ผ่าน signal
+    """
+
+    STATUSES = [-1, *VALID_STATUSES]
+    KEY_PREFIX = 'person_stats'
+
+    def _key(self, status):
+        return f'{self.KEY_PREFIX}:{status}'
+
+    @property
+    def _seeded_key(self):
+        return f'{self.KEY_PREFIX}:seeded_at'
+
+    @property
+    def _keys(self):
+        return [self._key(status) for status in self.STATUSES]
+
+    @property
+    def reconcile_interval(self):
+        return getattr(settings, 'STATS_RECONCILE_SECONDS', 60)
+
+    def reseed(self):
+        counts = count_statuses()
+        values = {self._key(status): counts.get(status, 0) for status in self.STATUSES}
+        values[self._seeded_key] = int(time.time())
+        SharedCounter.set_values(values)
+        return counts
+
+    def apply(self, deltas):
+        """deltas: dict สถานะ -> จำนวนที่เพิ่ม/ลด (ค่าลบคือลด)"""
+        deltas = {self._key(status): delta for status, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        if SharedCounter.add(deltas) < len(deltas):
+            # ยังไม่ตั้งต้นหรือแถวหาย ให้นับใหม่ในการอ่านครั้งถัดไป
+            SharedCounter.remove([self._seeded_key])
+
+    def transition(self, old, new):
+        # old เป็น None = เพิ่มคนใหม่, new เป็น None = ลบคนออก
+        if old == new:
+            return
+        deltas = Counter()
+        if old is not None:
+            deltas[old] -= 1
+        if new is not None:
+            deltas[new] += 1
+        self.apply(deltas)
+
+    def _read(self):
+        values = SharedCounter.get_values([self._seeded_key, *self._keys])
+        if self._seeded_key not in values:
+            return None, None
+        counts = {status: values.get(self._key(status), 0) for status in self.STATUSES}
+        return counts, values[self._seeded_key]
+
+    def read(self):
+        """ค่าปัจจุบันในตัวนับโดยไม่นับใหม่ คืนค่า None ถ้ายังไม่ได้ตั้งต้น"""
+        return self._read()[0]
+
+    def counts(self):
+        counts, seeded_at = self._read()
+        if counts is None or time.time() - seeded_at > self.reconcile_interval:
+            return self.reseed()
+        return counts
+
+
+stats_counter = StatsCounter()
+
+
+def person_stats():
+    """สถิติสำหรับ StatsView และ WebSocket อ่านจากตัวนับ ไม่ต้องนับทั้งตาราง"""
+    return format_stats(stats_counter.counts())
+
+
+# ระดับปริญญาตามชื่อปริญญา (ชุดเดียวกับใบสรุปผลใน ExportPDFResult)
+DEGREE_LEVELS = ['ป.ตรี', 'ป.โท', 'ป.เอก']
+BREAKDOWN_CACHE_KEY = 'person_stats:breakdown'
+
+
+def degree_group(name):
+    if 'ดุษฎีบัณฑิต' in name:
+        return 'ป.เอก'
+    elif 'มหาบัณฑิต' in name:
+        return 'ป.โท'
+    return 'ป.ตรี'
+
+
+def degree_group_expression():
+    """degree_group() ในรูป SQL CASE"""
+    return Case(
+        When(degree__contains='ดุษฎีบัณฑิต', then=Value('ป.เอก')),
+        When(degree__contains='มหาบัณฑิต', then=Value('ป.โท')),
+        default=Value('ป.ตรี'),
+        output_field=CharField(),
+    )
+
+
+def _breakdown_row(total=0, present=0, in_checkin_room=0, in_graduation_room=0):
+    return {
+        'total': total,
+        'present': present,
+        'absent': total - present,
+        'in_checkin_room': in_checkin_room,
+        'in_graduation_room': in_graduation_room,
+    }
+
+
+def compute_degree_breakdown():
+    """จำนวนทั้งหมด/มา/ขาดแยกตามปริญญาและระดับ ด้วย GROUP BY ครั้งเดียว
+
+    "มา" คือมี verified1..3 ช่องใดเป็น 1 หรือ 2 ส่วน in_checkin_room / in_graduation_room
+    นับจาก current_status
+    """
+    present = Q(verified1__in=[1, 2]) | Q(verified2__in=[1, 2]) | Q(verified3__in=[1, 2])
+    rows = (
+        Person.objects.annotate(level=degree_group_expression())
+        .values('level', 'degree')
+        .annotate(
+            total=Count('id'),
+            present=Count('id', filter=present),
+            in_checkin_room=Count('id', filter=Q(current_status=1)),
+            in_graduation_room=Count('id', filter=Q(current_status=2)),
+        )
+        .order_by()
+    )
+
+    counters = ('total', 'present', 'in_checkin_room', 'in_graduation_room')
+    levels = {level: dict.fromkeys(counters, 0) for level in DEGREE_LEVELS}
+    degrees = {}
+    for row in rows:
+        degree = row['degree'] or 'ไม่ระบุ'
+        entry = degrees.setdefault(degree, {'level': row['level'], **dict.fromkeys(counters, 0)})
+        for name in counters:
+            entry[name] += row[name]
+            levels[row['level']][name] += row[name]
+
+    overall = {name: sum(level[name] for level in levels.values()) for name in counters}
+    return {
+        'levels': [{'level': level, **_breakdown_row(**levels[level])} for level in DEGREE_LEVELS],
+        'degrees': [
+            {'degree': degree, 'level': entry.pop('level'), **_breakdown_row(**entry)}
+            for degree, entry in sorted(degrees.items())
+        ],
+        'overall': _breakdown_row(**overall),
+    }
+
+
+def degree_breakdown():
+    """compute_degree_breakdown() ผ่าน cache ที่ใช้เวอร์ชันข้อมูลเป็นส่วนของ key
+
+    เมื่อข้อมูลคนเปลี่ยน (จากโปรเซสใดก็ตาม) เวอร์ชันจะเลื่อน จึงไม่ใช้ค่าเก่าอีก
+    """
+    key = f'{BREAKDOWN_CACHE_KEY}:{data_version()}'
+    data = cache.get(key)
+    if data is None:
+        data = compute_degree_breakdown()
+        cache.set(key, data, getattr(settings, 'STATS_BREAKDOWN_CACHE_SECONDS', 60))
+    return data
+
+
+ARRIVALS_MAX_MINUTES = 24 * 60
+
+
+def compute_arrivals(minutes, scanner_id=None, now=None):
+    """จำนวนการสแกนต่อนาทีแยกตามเครื่องอ่านและทิศทาง ย้อนหลัง minutes นาที
+
+    นับจาก ScanEvent ด้วย GROUP BY (นาที, scanner_id, direction) ครั้งเดียว
+    แต่ละชุดข้อมูลเติม 0 ในนาทีที่ไม่มีการสแกน เพื่อนำไปวาดกราฟได้ทันที
+    """
+    now = now or timezone.now()
+    until = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    since = until - timedelta(minutes=minutes)
+
+    events = ScanEvent.objects.filter(timestamp__gte=since, timestamp__lt=until)
+    if scanner_id is not None:
+        events = events.filter(scanner_id=scanner_id)
+    # ตัดเป็นนาทีใน UTC โดยตรง ถ้าใช้ TIME_ZONE บน MySQL จะเป็น CONVERT_TZ ซึ่งคืน NULL
+    # เมื่อไม่ได้โหลดตาราง timezone ไว้
+    rows = (
+        events.annotate(minute=TruncMinute('timestamp', tzinfo=dt_timezone.utc))
+        .values('minute', 'scanner_id', 'direction')
+        .annotate(scans=Count('id'), persons=Count('person', distinct=True))
+        .order_by()
+    )
+
+    buckets = [since + timedelta(minutes=i) for i in range(minutes)]
+    position = {bucket: i for i, bucket in enumerate(buckets)}
+    series = {}
+    for row in rows:
+        key = (row['scanner_id'], row['direction'])
+        entry = series.setdefault(key, {'scans': [0] * minutes, 'persons': [0] * minutes})
+        i = position.get(row['minute'])
+        if i is not None:
+            entry['scans'][i] = row['scans']
+            entry['persons'][i] = row['persons']
+
+    return {
+        'since': since,
+        'until': until,
+        'minutes': buckets,
+        'series': [
+            {'scanner_id': scanner, 'direction': direction, **series[(scanner, direction)]}
+            for scanner, direction in sorted(series)
+        ],
+    }
+
+
+def arrivals(minutes=60, scanner_id=None):
+    """compute_arrivals() ผ่าน cache อายุสั้น (STATS_ARRIVALS_CACHE_SECONDS)"""
+    key = f'person_stats:arrivals:{minutes}:{scanner_id or "all"}'
+    data = cache.get(key)
+    if data is None:
+        data = compute_arrivals(minutes, scanner_id)
+        cache.set(key, data, getattr(settings, 'STATS_ARRIVALS_CACHE_SECONDS', 15))
+    return data
@@ -1,3 +1,1109 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import queue
+from unittest import mock
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from tablib import Dataset
+from tablib.exceptions import UnsupportedFormat
+from django.utils import timezone
+from .debounce import scan_debouncer
+from .epc_index import epc_index
+from .filters import filter_persons
+from .importer import ImportRowsError, import_persons, import_persons_by_row
+from .ingest import ScanQueue, write_batch
+from .bulk import bulk_set_verified, delete_persons
+from .consumers import broadcast_bulk_delete, broadcast_bulk_update
+from .middleware import brotli
+from .models import Person, PersonTombstone, ScanEvent, SeatCounter
+from .renderers import FastJSONRenderer, orjson
+from .resources import PersonResource
+from .rfid import process_tags
+from .stats import count_statuses, stats_counter
+from .versioning import bump_data_version, data_version
 
-# Create your tests here.
+
+def status_counts():
+    # รูปเดียวกับ stats_counter.read() (มีทุกสถานะ แม้จำนวนเป็น 0)
+    return {-1: 0, 0: 0, 1: 0, 2: 0, **count_statuses()}
+
+
+class CounterTestCase(TestCase):
+    """ล้างสถานะในหน่วยความจำของโปรเซส (ดัชนี EPC, debounce) ระหว่างเทส
+
+    และสร้างแถวเวอร์ชันข้อมูลไว้ก่อน จำนวน query ที่นับจึงไม่รวมการตั้งต้นเวอร์ชัน
+    """
+
+    def setUp(self):
+        epc_index.clear()
+        scan_debouncer.clear()
+        self.addCleanup(epc_index.clear)
+        self.addCleanup(scan_debouncer.clear)
+        data_version()
+
+    def make_person(self, name, **fields):
+        fields.setdefault('degree', 'วิศวกรรมศาสตรบัณฑิต')
+        return Person.objects.create(name=name, **fields)
+
+    def assertCountersMatch(self):
+        self.assertEqual(stats_counter.read(), status_counts())
+
+
+class ScanTestCase(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = self.make_person('alice', rfid='E-ALICE')
+        self.bob = self.make_person('bob', rfid='E-BOB')
+        self.free = self.make_person('free')
+        stats_counter.reseed()
+
+    def scan(self, epcs, scanner_type='in', scanner_id=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return process_tags([{'epc': epc} for epc in epcs], scanner_type, scanner_id)
+
+
+@override_settings(RFID_INDEX_ENABLED=True)
+class EPCIndexTests(ScanTestCase):
+
+    def test_own_writes_keep_index_loaded(self):
+        loads = epc_index.loads
+        self.scan(['E-ALICE'])
+        self.scan(['E-BOB'], scanner_type='out', scanner_id=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.name = 'robert'
+            self.bob.save()
+        self.scan(['E-BOB'], scanner_id=3)
+
+        self.assertEqual(epc_index.loads, loads + 1)
+        self.assertEqual(epc_index.peek('E-BOB').name, 'robert')
+
+    def test_reloads_after_write_from_other_process(self):
+        loads = epc_index.loads
+        self.scan(['E-ALICE'])
+        # โปรเซสอื่นย้าย EPC แล้วเลื่อนเวอร์ชัน (ไม่มี signal ในโปรเซสนี้)
+        Person.objects.filter(pk=self.bob.pk).update(rfid='E-MOVED')
+        bump_data_version()
+
+        results, _ = self.scan(['E-MOVED'])
+
+        self.assertEqual(epc_index.loads, loads + 2)
+        self.assertEqual(results, ["rfid: E-MOVED name: bob status: อัปเดตสถานะสำเร็จ"])
+
+    def test_update_without_signal_is_not_treated_as_repeat(self):
+        self.scan(['E-ALICE'])
+        Person.objects.filter(pk=self.alice.pk).update(verified1=0, current_status=0)
+        stats_counter.reseed()
+        scan_debouncer.clear()
+
+        results, changes = self.scan(['E-ALICE'])
+
+        self.assertEqual(results, ["rfid: E-ALICE name: alice status: อัปเดตสถานะสำเร็จ"])
+        self.assertEqual([change['id'] for change in changes], [self.alice.id])
+        self.assertEqual(Person.objects.get(pk=self.alice.pk).verified1, 1)
+        self.assertCountersMatch()
+
+    def test_row_already_written_elsewhere_counts_once(self):
+        epc_index.lookup([])
+        # เครื่องอ่านอื่นเขียนสถานะเดียวกันไปก่อน ดัชนีของโปรเซสนี้ยังเห็นค่าเดิม
+        Person.objects.filter(pk=self.alice.pk).update(verified1=1, current_status=1)
+        stats_counter.reseed()
+
+        results, changes = self.scan(['E-ALICE', 'E-BOB'])
+
+        self.assertEqual(results, [
+            "rfid: E-ALICE name: alice status: แท็กนี้ถูกแสกนแล้ว",
+            "rfid: E-BOB name: bob status: อัปเดตสถานะสำเร็จ",
+        ])
+        self.assertEqual([change['id'] for change in changes], [self.bob.id])
+        self.assertCountersMatch()
+
+    def test_binding_removed_elsewhere_claims_a_free_person(self):
+        epc_index.lookup([])
+        Person.objects.filter(pk=self.alice.pk).update(rfid=None)
+        Person.objects.filter(pk=self.free.pk).update(rfid='E-FREE')
+
+        results, _ = self.scan(['E-ALICE'])
+
+        self.assertEqual(results, ["epc: E-ALICE name: alice status: เพิ่มรหัส RFID สำเร็จและอัปเดตสถานะแล้ว"])
+        self.assertEqual(epc_index.peek('E-ALICE').id, self.alice.id)
+        self.assertCountersMatch()
+
+
+@override_settings(RFID_INDEX_ENABLED=True)
+class ProcessTagsTests(ScanTestCase):
+
+    def test_results_follow_tag_order(self):
+        results, changes = self.scan(['E-BOB', 'E-UNKNOWN-1', 'E-ALICE', 'E-UNKNOWN-2'])
+
+        self.assertEqual(results, [
+            "rfid: E-BOB name: bob status: อัปเดตสถานะสำเร็จ",
+            "epc: E-UNKNOWN-1 name: free status: เพิ่มรหัส RFID สำเร็จและอัปเดตสถานะแล้ว",
+            "rfid: E-ALICE name: alice status: อัปเดตสถานะสำเร็จ",
+            "rfid: E-UNKNOWN-2 name: null status: ไม่พบข้อมูลในระบบ",
+        ])
+        self.assertEqual(
+            [change['id'] for change in changes],
+            [self.bob.id, self.free.id, self.alice.id],
+        )
+        self.assertEqual(changes[1]['fields']['rfid'], 'E-UNKNOWN-1')
+
+    def test_writes_status(self):
+        self.scan(['E-ALICE', 'E-UNKNOWN'], scanner_type='out', scanner_id=2)
+
+        alice = Person.objects.get(pk=self.alice.pk)
+        self.assertEqual((alice.verified2, alice.current_status), (2, 2))
+        self.assertIsNotNone(alice.verified_updated_at2)
+        self.assertEqual(alice.status_changed_at, alice.verified_updated_at2)
+        free = Person.objects.get(pk=self.free.pk)
+        self.assertEqual((free.rfid, free.verified2, free.current_status), ('E-UNKNOWN', 2, 2))
+
+    def test_updates_index_and_counters_after_commit(self):
+        self.scan(['E-ALICE', 'E-NEW'])
+
+        self.assertEqual(epc_index.peek('E-ALICE').current_status, 1)
+        self.assertEqual(epc_index.peek('E-NEW').id, self.free.id)
+        self.assertCountersMatch()
+
+    def test_query_count(self):
+        # ดัชนีโหลดแล้ว: savepoint, เวอร์ชัน, UPDATE แบบมีเงื่อนไข, journal, release
+        # และหลัง commit: ตัวนับ, เลื่อนเวอร์ชัน (savepoint, UPDATE, อ่านกลับ, release)
+        epc_index.lookup([])
+        with self.assertNumQueries(10):
+            self.scan(['E-ALICE', 'E-BOB'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        for i in range(20):
+            self.make_person(f'p{i}', rfid=f'E-{i}')
+        epc_index.lookup([])
+        with self.assertNumQueries(10):
+            self.scan([f'E-{i}' for i in range(20)])
+
+    def test_same_status_is_not_rewritten(self):
+        self.scan(['E-ALICE'])
+        scan_debouncer.clear()
+
+        results, changes = self.scan(['E-ALICE'])
+
+        self.assertEqual(results, ["rfid: E-ALICE name: alice status: แท็กนี้ถูกแสกนแล้ว"])
+        self.assertEqual(changes, [])
+        self.assertCountersMatch()
+
+
+class ManualScanQueue(ScanQueue):
+    # ไม่เปิด writer thread เทสดึง batch และเขียนเองในเธรดเดียวกับ transaction ของเทส
+    def _ensure_writer(self):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=10)
+
+
+@override_settings(RFID_INGEST_FLUSH_MS=1)
+class RFIDIngestTests(ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.queue = ManualScanQueue()
+        patcher = mock.patch('api.views.scan_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, payload):
+        return self.client.post('/api/rfidAPI/ingest/', json.dumps(payload), content_type='application/json')
+
+    def test_queues_reads_and_answers_202(self):
+        response = self.post({'tags': [{'epc': 'E-ALICE'}, {'epc': 'E-BOB'}, {}], 'scanner_type': 'in', 'scanner_id': '1'})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'queued': 2})
+        self.assertEqual(self.queue.stats()['pending'], 2)
+        # ยังไม่แตะฐานข้อมูลจนกว่า writer จะ flush
+        self.assertEqual(Person.objects.get(pk=self.alice.pk).verified1, 0)
+
+    def test_rejects_bad_payload(self):
+        self.assertEqual(self.post({'tags': [{'epc': 'E-ALICE'}], 'scanner_type': 'up', 'scanner_id': 1}).status_code, 400)
+        response = self.client.post('/api/rfidAPI/ingest/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_full_queue_answers_503(self):
+        tags = [{'epc': f'E-{i}'} for i in range(11)]
+
+        response = self.post({'tags': tags, 'scanner_type': 'in', 'scanner_id': 1})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.queue.stats()['rejected'], 11)
+        self.assertEqual(self.queue.stats()['pending'], 0)
+
+    @override_settings(RFID_INGEST_BATCH_SIZE=2)
+    def test_flush_writes_in_batches(self):
+        self.post({'tags': [{'epc': 'E-ALICE'}, {'epc': 'E-BOB'}], 'scanner_type': 'in', 'scanner_id': 1})
+        self.post({'tags': [{'epc': 'E-ALICE'}], 'scanner_type': 'out', 'scanner_id': 2})
+
+        first = self.queue._next_batch()
+        second = self.queue._next_batch()
+        with self.captureOnCommitCallbacks(execute=True):
+            write_batch(first)
+            write_batch(second)
+
+        self.assertEqual(first, [('E-ALICE', 'in', 1), ('E-BOB', 'in', 1)])
+        self.assertEqual(second, [('E-ALICE', 'out', 2)])
+        self.assertEqual(
+            list(Person.objects.filter(pk__in=[self.alice.pk, self.bob.pk]).order_by('pk')
+                 .values_list('verified1', 'verified2', 'current_status')),
+            [(1, 2, 2), (1, 0, 1)],
+        )
+        self.assertCountersMatch()
+
+
+@override_settings(RFID_DEBOUNCE_SECONDS=2.0)
+class DebounceTests(ScanTestCase):
+
+    def test_drops_repeats_without_queries(self):
+        self.scan(['E-ALICE'])
+
+        with self.assertNumQueries(0):
+            results, changes = self.scan(['E-ALICE', 'E-ALICE'])
+
+        self.assertEqual(results, ["rfid: E-ALICE name: alice status: แท็กนี้ถูกแสกนแล้ว"] * 2)
+        self.assertEqual(changes, [])
+
+    def test_is_per_scanner(self):
+        self.scan(['E-ALICE'], scanner_type='in', scanner_id=1)
+
+        _, changes = self.scan(['E-ALICE'], scanner_type='out', scanner_id=1)
+
+        self.assertEqual(changes[0]['fields']['verified1'], 2)
+
+    @override_settings(RFID_DEBOUNCE_SECONDS=0)
+    def test_zero_ttl_disables_debounce(self):
+        self.scan(['E-ALICE'])
+
+        results, _ = self.scan(['E-ALICE'])
+
+        self.assertEqual(results, ["rfid: E-ALICE name: alice status: แท็กนี้ถูกแสกนแล้ว"])
+        self.assertEqual(scan_debouncer.stats()['size'], 0)
+
+    def test_failure_forgets_debounce(self):
+        from . import rfid
+
+        with mock.patch.object(rfid, '_apply_reads', side_effect=IntegrityError('rfid')):
+            with self.assertRaises(IntegrityError):
+                self.scan(['E-ALICE'])
+
+        # การอ่านครั้งถัดไปต้องไม่ถูกตัดว่าซ้ำ
+        _, changes = self.scan(['E-ALICE'])
+        self.assertEqual([change['id'] for change in changes], [self.alice.id])
+
+
+class ClaimUnboundTests(ScanTestCase):
+
+    def test_claims_null_rfid_before_blank(self):
+        blank = self.make_person('blank', rfid='')
+        stats_counter.reseed()
+
+        self.scan(['E-NEW-1', 'E-NEW-2'])
+
+        self.assertEqual(Person.objects.get(pk=self.free.pk).rfid, 'E-NEW-1')
+        self.assertEqual(Person.objects.get(pk=blank.pk).rfid, 'E-NEW-2')
+        self.assertCountersMatch()
+
+    def test_unknown_epc_without_free_person(self):
+        self.free.rfid = 'E-FREE'
+        self.free.save()
+
+        results, changes = self.scan(['E-NOBODY'])
+
+        self.assertEqual(results, ["rfid: E-NOBODY name: null status: ไม่พบข้อมูลในระบบ"])
+        self.assertEqual(changes, [])
+
+    def test_retries_once_after_integrity_error(self):
+        from . import rfid
+
+        real = rfid._apply_reads
+        calls = []
+
+        def conflict_once(*args):
+            # รอบแรกจำลองว่าเครื่องอ่านอื่นผูก EPC เดียวกันไปก่อน
+            calls.append(args)
+            if len(calls) == 1:
+                raise IntegrityError('rfid')
+            return real(*args)
+
+        with mock.patch.object(rfid, '_apply_reads', side_effect=conflict_once):
+            _, changes = self.scan(['E-NEW'])
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([change['id'] for change in changes], [self.free.id])
+        self.assertEqual(Person.objects.get(pk=self.free.pk).rfid, 'E-NEW')
+
+
+class ScanJournalTests(ScanTestCase):
+
+    def events(self):
+        return list(ScanEvent.objects.order_by('id').values_list('epc', 'person_id', 'scanner_id', 'direction'))
+
+    def test_every_accepted_read_is_journaled(self):
+        self.scan(['E-ALICE', 'E-NEW', 'E-NOBODY'], scanner_type='out', scanner_id=2)
+        scan_debouncer.clear()
+        self.scan(['E-ALICE'], scanner_type='out', scanner_id=2)
+
+        self.assertEqual(self.events(), [
+            ('E-ALICE', self.alice.id, 2, 'out'),
+            ('E-NEW', self.free.id, 2, 'out'),
+            ('E-NOBODY', None, 2, 'out'),
+            # อ่านซ้ำหลังพ้นช่วง debounce สถานะไม่เปลี่ยนแต่ยังบันทึก
+            ('E-ALICE', self.alice.id, 2, 'out'),
+        ])
+
+    def test_debounced_reads_are_not_journaled(self):
+        self.scan(['E-ALICE', 'E-ALICE'])
+
+        self.assertEqual(self.events(), [('E-ALICE', self.alice.id, 1, 'in')])
+
+    def test_replay_rebuilds_status_from_events(self):
+        self.scan(['E-ALICE', 'E-BOB'])
+        self.scan(['E-ALICE'], scanner_type='out', scanner_id=3)
+        Person.objects.update(verified1=0, verified3=0, current_status=0)
+
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('replay_scans', stdout=out)
+
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(
+            list(Person.objects.filter(pk__in=[self.alice.pk, self.bob.pk]).order_by('pk')
+                 .values_list('verified1', 'verified3', 'current_status')),
+            [(1, 2, 2), (1, 0, 1)],
+        )
+        self.assertCountersMatch()
+
+
+class PersonFilterTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_person('Somchai Dee', nisit='6510000001', degree='ป.ตรี', seat=1, rfid='E-1')
+        self.make_person('somsri Jai', nisit='6510000002', degree='ป.โท', seat=2, rfid='')
+        self.make_person('Anan Suk', nisit='6620000003', degree='ป.ตรี', seat=3,
+                         verified2=1, verified_updated_at2=timezone.now())
+        self.make_person('Boon Mee', nisit='6620000004', degree='ป.เอก', seat=4, rfid='E-4', verified1=2)
+
+    def names(self, query):
+        response = self.client.get(f'/api/person/?all=true&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.json()]
+
+    def test_filters(self):
+        cases = {
+            'q=som': ['Somchai Dee', 'somsri Jai'],
+            'q=662': ['Anan Suk', 'Boon Mee'],
+            'degree=ป.ตรี&degree=ป.เอก': ['Somchai Dee', 'Anan Suk', 'Boon Mee'],
+            'seat_min=2&seat_max=3': ['somsri Jai', 'Anan Suk'],
+            'rfid=bound': ['Somchai Dee', 'Boon Mee'],
+            'rfid=unbound': ['somsri Jai', 'Anan Suk'],
+            'status=1,2': ['Anan Suk', 'Boon Mee'],
+            'verified2=1': ['Anan Suk'],
+            'verified1=0&degree=ป.ตรี&rfid=bound': ['Somchai Dee'],
+            'q=boon&status=0': [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), expected)
+
+    def test_invalid_values(self):
+        response = self.client.get('/api/person/?seat_min=x&rfid=maybe&status=a&verified3=y')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'seat_min', 'rfid', 'status', 'verified3'})
+
+    def test_filters_use_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('อ่านแผนจาก EXPLAIN QUERY PLAN ของ SQLite')
+        # q ไม่อยู่ในรายการ: LIKE ของ SQLite ไม่สนตัวพิมพ์จึงใช้ index แบบ BINARY ไม่ได้ (MySQL ใช้ได้)
+        for query in ['degree=ป.ตรี', 'seat_min=2&seat_max=3', 'rfid=bound', 'rfid=unbound',
+                      'status=1,2', 'verified1=0', 'verified2=1', 'verified3=2', 'status=1&seat_min=2']:
+            with self.subTest(query=query):
+                queryset, _ = filter_persons(Person.objects.all(), QueryDict(query))
+                plan = queryset.explain()
+                # SEARCH = ค้นผ่าน index, SCAN = ไล่ทั้งตาราง (หรือทั้ง index)
+                self.assertIn('SEARCH api_person', plan)
+                self.assertNotIn('SCAN api_person', plan)
+
+
+class StatsCounterTests(CounterTestCase):
+
+    def test_reseed_counts_table(self):
+        self.make_person('a')
+        self.make_person('b', verified1=1)
+
+        self.assertEqual(stats_counter.counts(), {0: 1, 1: 1})
+        self.assertEqual(stats_counter.read(), {-1: 0, 0: 1, 1: 1, 2: 0})
+
+    def test_signals_keep_counter_in_step(self):
+        stats_counter.reseed()
+        with self.captureOnCommitCallbacks(execute=True):
+            person = self.make_person('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            person.verified3 = 2
+            person.verified_updated_at3 = timezone.now()
+            person.save()
+        self.assertEqual(stats_counter.read(), {-1: 0, 0: 0, 1: 0, 2: 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            person.delete()
+        self.assertEqual(stats_counter.read(), {-1: 0, 0: 0, 1: 0, 2: 0})
+
+    def test_apply_without_seed_forces_recount(self):
+        self.make_person('a')
+        stats_counter.apply({0: 5})
+
+        self.assertIsNone(stats_counter.read())
+        self.assertEqual(stats_counter.counts()[0], 1)
+
+    @override_settings(STATS_RECONCILE_SECONDS=0)
+    def test_reconciles_drift(self):
+        self.make_person('a')
+        stats_counter.reseed()
+        stats_counter.apply({0: 5})
+
+        with mock.patch('api.stats.time.time', return_value=stats_counter._read()[1] + 1):
+            self.assertEqual(stats_counter.counts()[0], 1)
+
+    def test_check_stats_reports_and_fixes_drift(self):
+        self.make_person('a')
+        stats_counter.reseed()
+        stats_counter.apply({0: 2})
+
+        out = io.StringIO()
+        call_command('check_stats', '--fix', stdout=out)
+
+        self.assertIn('{0: 2}', out.getvalue())
+        self.assertCountersMatch()
+
+
+class PersonPaginationTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.persons = [self.make_person(f'p{i}', seat=10 - i) for i in range(5)]
+
+    def walk(self, url):
+        rows = []
+        pages = 0
+        while url:
+            body = self.client.get(url).json()
+            rows += body['results']
+            url = body['next']
+            pages += 1
+        return rows, pages
+
+    def test_cursor_walks_every_row_once(self):
+        rows, pages = self.walk('/api/person/?page_size=2')
+
+        self.assertEqual(pages, 3)
+        self.assertEqual([row['id'] for row in rows], [person.id for person in self.persons])
+
+    def test_ordering_by_seat(self):
+        rows, _ = self.walk('/api/person/?page_size=2&ordering=-seat')
+
+        self.assertEqual([row['seat'] for row in rows], [10, 9, 8, 7, 6])
+
+    def test_unknown_ordering_falls_back_to_id(self):
+        rows, _ = self.walk('/api/person/?ordering=name')
+
+        self.assertEqual([row['id'] for row in rows], [person.id for person in self.persons])
+
+    def test_rows_inserted_between_pages_are_not_repeated(self):
+        first = self.client.get('/api/person/?page_size=2&ordering=seat').json()
+        self.make_person('early', seat=1)
+
+        rest, _ = self.walk(first['next'])
+
+        self.assertEqual([row['seat'] for row in first['results'] + rest], [6, 7, 8, 9, 10])
+
+    def test_all_returns_every_row(self):
+        rows = self.client.get('/api/person/?all=true&page_size=2').json()
+
+        self.assertEqual([row['id'] for row in rows], [person.id for person in self.persons])
+        self.assertEqual(rows[0]['verified'], rows[0]['current_status'])
+
+
+class ConditionalGetTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.person = self.make_person('alice')
+        stats_counter.reseed()
+        self.urls = ['/api/person/', '/api/stats/', f'/api/person/{self.person.pk}/']
+
+    def test_unchanged_data_answers_304_without_reading_persons(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url).headers['ETag']
+                # อ่านแค่เวอร์ชันจาก SharedCounter
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etags = [self.client.get(url).headers['ETag'] for url in self.urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person.name = 'alicia'
+            self.person.save()
+
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_write_from_other_process_changes_etag(self):
+        etag = self.client.get('/api/stats/').headers['ETag']
+        bump_data_version()
+
+        self.assertEqual(self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_each_query_string_has_its_own_etag(self):
+        first = self.client.get('/api/person/?status=0').headers['ETag']
+        second = self.client.get('/api/person/?status=1').headers['ETag']
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.client.get('/api/person/?status=1', HTTP_IF_NONE_MATCH=first).status_code, 200)
+
+
+@override_settings(PERSON_SYNC_OVERLAP_SECONDS=5, PERSON_TOMBSTONE_RETENTION_HOURS=24)
+class PersonChangesTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = self.make_person('alice')
+        self.bob = self.make_person('bob')
+
+    def token(self, when):
+        return str(int(when.timestamp() * 1_000_000))
+
+    def changes(self, since):
+        return self.client.get(f'/api/person/changes/?since={since}')
+
+    def test_first_call_asks_for_full_load(self):
+        body = self.client.get('/api/person/changes/').json()
+
+        self.assertTrue(body['reset'])
+        self.assertTrue(body['token'].isdigit())
+
+    def test_invalid_token(self):
+        self.assertEqual(self.changes('yesterday').status_code, 400)
+
+    def test_returns_rows_changed_since_token(self):
+        since = self.token(timezone.now() - timedelta(minutes=1))
+        Person.objects.filter(pk=self.bob.pk).update(updated_at=timezone.now() - timedelta(minutes=2))
+
+        body = self.changes(since).json()
+
+        self.assertFalse(body['reset'])
+        self.assertEqual([row['id'] for row in body['changed']], [self.alice.id])
+        self.assertEqual(body['deleted'], [])
+
+    def test_overlap_keeps_late_commits(self):
+        now = timezone.now()
+        Person.objects.filter(pk=self.alice.pk).update(updated_at=now - timedelta(seconds=3))
+        Person.objects.filter(pk=self.bob.pk).update(updated_at=now - timedelta(seconds=30))
+
+        body = self.changes(self.token(now)).json()
+
+        self.assertEqual([row['id'] for row in body['changed']], [self.alice.id])
+
+    def test_reports_deleted_ids(self):
+        since = self.token(timezone.now())
+        ids = [self.alice.id, self.bob.id]
+        self.alice.delete()
+        delete_persons(Person.objects.filter(pk=self.bob.pk))
+
+        body = self.changes(since).json()
+
+        self.assertFalse(body['reset'])
+        self.assertEqual(body['deleted'], ids)
+
+    def test_token_older_than_tombstones_is_gone(self):
+        response = self.changes(self.token(timezone.now() - timedelta(hours=25)))
+
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['reset'])
+        self.assertEqual(response.json()['changed'], [])
+
+    def test_database_reset_forces_full_load(self):
+        since = self.token(timezone.now())
+        PersonTombstone.objects.create(person_id=None)
+
+        self.assertTrue(self.changes(since).json()['reset'])
+
+    @override_settings(PERSON_SYNC_MAX_CHANGES=1)
+    def test_too_many_changes_forces_full_load(self):
+        body = self.changes(self.token(timezone.now() - timedelta(minutes=1))).json()
+
+        self.assertTrue(body['reset'])
+        self.assertEqual(body['changed'], [])
+
+    def test_old_tombstones_are_pruned(self):
+        PersonTombstone.objects.create(person_id=1, deleted_at=timezone.now() - timedelta(hours=30))
+
+        PersonTombstone.record([self.alice.id])
+
+        self.assertEqual(list(PersonTombstone.objects.values_list('person_id', flat=True)), [self.alice.id])
+
+
+class FastJSONRendererTests(TestCase):
+
+    def test_matches_drf_output(self):
+        if orjson is None:
+            self.skipTest('orjson ไม่ได้ติดตั้ง')
+        data = {
+            'name': 'สมชาย ใจดี',
+            'at': datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+            'price': Decimal('1.50'),
+            'rows': [{'id': 1, 'rfid': None, 'ok': True}],
+            1: 'key เป็นตัวเลข',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_uses_drf(self):
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, JSONRenderer().render({'a': 1}, 'application/json; indent=2'))
+
+
+class APICompressionTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(30):
+            self.make_person(f'person {i}')
+
+    def get(self, encoding, url='/api/person/?all=true'):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+
+    @override_settings(API_COMPRESS_MIN_BYTES=1024)
+    def test_gzip_above_threshold(self):
+        plain = self.get('')
+        response = self.get('gzip, deflate')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+
+    @override_settings(API_COMPRESS_MIN_BYTES=10 ** 6)
+    def test_small_response_is_not_compressed(self):
+        self.assertFalse(self.get('gzip, br').has_header('Content-Encoding'))
+
+    def test_brotli_preferred(self):
+        if brotli is None:
+            self.skipTest('brotli ไม่ได้ติดตั้ง')
+        response = self.get('gzip, br')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content)), self.get('').json())
+
+    def test_no_accepted_encoding(self):
+        self.assertFalse(self.get('identity').has_header('Content-Encoding'))
+
+    def test_streamed_roster_is_gzipped(self):
+        response = self.get('gzip', '/api/person/?stream=true')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(json.loads(body)), 30)
+
+    @override_settings(DEBUG=True)  # Django log การห่อ middleware เฉพาะตอน DEBUG
+    async def test_async_stack_does_not_adapt_middleware(self):
+        # Django log "Asynchronous handler adapted for middleware ..." เมื่อต้องห่อ middleware ที่รองรับแค่ sync
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            response = await AsyncClient().get('/api/stats/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DEBUG=True)  # Django log การห่อ middleware เฉพาะตอน DEBUG
+    async def test_async_ingest_is_not_adapted(self):
+        payload = json.dumps({'tags': [{'epc': 'E-1'}], 'scanner_type': 'in', 'scanner_id': 1})
+        with mock.patch('api.views.scan_queue', ManualScanQueue()), self.assertNoLogs('django.request', 'DEBUG'):
+            response = await AsyncClient().post('/api/rfidAPI/ingest/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+
+@override_settings(PERSON_STREAM_CHUNK_SIZE=4)
+class PersonStreamTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            self.make_person(f'p{i}', verified1=i % 2)
+
+    def test_sync_stream_matches_all(self):
+        response = self.client.get('/api/person/?stream=true&status=1')
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        chunks = list(response.streaming_content)
+        # [ + แถวทีละ 4 + ] : มากกว่าหนึ่งก้อน ไม่ได้รวมทั้งหมดไว้ก่อนส่ง
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(json.loads(b''.join(chunks)), self.client.get('/api/person/?all=true&status=1').json())
+
+    def test_empty_stream_is_valid_json(self):
+        response = self.client.get('/api/person/?stream=true&status=2')
+
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    async def test_asgi_stream_is_async(self):
+        response = await AsyncClient().get('/api/person/?stream=true')
+
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual([row['name'] for row in json.loads(b''.join(chunks))], [f'p{i}' for i in range(10)])
+
+    async def test_asgi_stream_is_gzipped(self):
+        response = await AsyncClient().get('/api/person/?stream=true', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(len(json.loads(body)), 10)
+
+
+class BulkSetVerifiedTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.persons = [self.make_person(f'p{i}', rfid=f'E-{i}') for i in range(3)]
+        self.persons[0].verified2 = 2
+        self.persons[0].verified_updated_at2 = timezone.now()
+        self.persons[0].save()
+        stats_counter.reseed()
+        epc_index.lookup([])
+
+    def test_changes_only_rows_that_differ(self):
+        ids = [person.id for person in self.persons]
+        with self.captureOnCommitCallbacks(execute=True):
+            changed, changes = bulk_set_verified(ids, 'verified2', 2)
+
+        self.assertEqual(changed, ids[1:])
+        self.assertEqual([change['id'] for change in changes], ids[1:])
+        self.assertEqual(changes[0]['fields']['current_status'], 2)
+        self.assertEqual(
+            list(Person.objects.order_by('id').values_list('verified2', 'current_status')),
+            [(2, 2)] * 3,
+        )
+        self.assertEqual(epc_index.peek('E-1').current_status, 2)
+        self.assertCountersMatch()
+
+    def test_invalid_value_falls_back_to_latest_slot(self):
+        # ค่านอก 0-2 ไม่นับเป็นสถานะ current_status จึงกลับไปใช้ช่องล่าสุดที่เหลือ
+        person = self.persons[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_set_verified([person.id], 'verified2', 9)
+
+        person.refresh_from_db()
+        self.assertEqual((person.verified2, person.current_status), (9, 0))
+        self.assertCountersMatch()
+
+    def test_nothing_to_change(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(bulk_set_verified([self.persons[0].id], 'verified2', 2), ([], []))
+
+    def test_put_endpoint_updates_in_one_statement(self):
+        ids = [person.id for person in self.persons]
+        body = json.dumps({'ids': ids, 'verified': 2, 'verified_field': 'verified2'})
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/person/', body, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated_count': 2, 'updated_ids': [str(pk) for pk in ids[1:]]})
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_person"')]
+        self.assertEqual(len(updates), 1)
+        self.assertCountersMatch()
+
+    def test_put_endpoint_rejects_bad_input(self):
+        ids = [self.persons[1].id]
+        for payload in (
+            {'ids': ids, 'verified': 2, 'verified_field': 'current_status'},
+            {'ids': ids, 'verified': 'x', 'verified_field': 'verified2'},
+            {'ids': [], 'verified': 2, 'verified_field': 'verified2'},
+        ):
+            response = self.client.put('/api/person/', json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+
+        self.assertEqual(Person.objects.get(id=ids[0]).verified2, 0)
+
+
+@override_settings(USE_CHANNEL=True, WS_BULK_MAX_ITEMS=2)
+class BroadcastBulkTests(TestCase):
+
+    def setUp(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        patcher = mock.patch('api.consumers.get_channel_layer', return_value=layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.group_send = layer.group_send
+
+    def sent(self):
+        return [args[1]['message'] for args, _ in self.group_send.call_args_list]
+
+    def test_bulk_update_is_chunked(self):
+        now = timezone.now()
+        changes = [{'id': i, 'fields': {'verified1': 1, 'verified_updated_at1': now}} for i in range(5)]
+        broadcast_bulk_update(changes, source='rfid')
+
+        messages = self.sent()
+        self.assertEqual([[item['id'] for item in m['items']] for m in messages], [[0, 1], [2, 3], [4]])
+        self.assertTrue(all(m['action'] == 'bulk_update' and m['source'] == 'rfid' for m in messages))
+        # datetime ถูกแปลงเป็นข้อความก่อนส่ง
+        self.assertIsInstance(messages[0]['items'][0]['fields']['verified_updated_at1'], str)
+        self.assertEqual(changes[0]['fields']['verified_updated_at1'], now)
+
+    def test_bulk_delete_is_chunked(self):
+        broadcast_bulk_delete(i for i in range(3))
+
+        self.assertEqual(self.sent(), [
+            {'action': 'bulk_delete', 'ids': [0, 1]},
+            {'action': 'bulk_delete', 'ids': [2]},
+        ])
+        self.assertTrue(all(args[0] == 'crud01_group' for args, _ in self.group_send.call_args_list))
+
+    def test_empty_sends_nothing(self):
+        broadcast_bulk_update([])
+        broadcast_bulk_delete([])
+
+        self.group_send.assert_not_called()
+
+
+class SeatCounterTests(TestCase):
+
+    def test_allocate_continues_after_existing_seats(self):
+        Person.objects.create(name='a', degree='d', seat=41)
+        SeatCounter.reset()
+
+        self.assertEqual(list(SeatCounter.allocate()), [42])
+        self.assertEqual(list(SeatCounter.allocate(3)), [43, 44, 45])
+
+    def test_explicit_seat_moves_counter(self):
+        Person.objects.create(name='a', degree='d')
+        Person.objects.create(name='b', degree='d', seat=100)
+
+        self.assertEqual(Person.objects.create(name='c', degree='d').seat, 101)
+
+    def test_ensure_above_accepts_strings(self):
+        SeatCounter.allocate()
+        SeatCounter.ensure_above('20')
+
+        self.assertEqual(list(SeatCounter.allocate()), [21])
+
+    def test_allocate_is_one_update(self):
+        # ไม่อ่านที่นั่งสูงสุดจากตาราง Person: savepoint, UPDATE, SELECT ค่าที่ได้, release
+        SeatCounter.allocate()
+        with self.assertNumQueries(4):
+            SeatCounter.allocate()
+
+    def test_reset_keeps_row_and_restarts_from_one(self):
+        SeatCounter.allocate(5)
+        SeatCounter.reset()
+
+        # แถวยังอยู่ ผู้จองถัดไปรอล็อกแถวเดิมแทนการแข่งกันสร้างแถวใหม่
+        self.assertEqual(SeatCounter.objects.get(name=SeatCounter.SEAT).next_value, 1)
+        self.assertEqual(list(SeatCounter.allocate(2)), [1, 2])
+
+    def test_reset_without_row_seeds_it(self):
+        Person.objects.create(name='a', degree='d', seat=7)
+        SeatCounter.objects.all().delete()
+        SeatCounter.reset()
+
+        self.assertEqual(list(SeatCounter.objects.values_list('name', 'next_value')), [(SeatCounter.SEAT, 8)])
+
+    def test_named_counter_uses_given_field(self):
+        Person.objects.create(name='a', degree='d', seat=30)
+
+        self.assertEqual(list(SeatCounter.allocate(name='other', field='seat')), [31])
+        self.assertEqual(list(SeatCounter.allocate(name='other', field='seat')), [32])
+
+
+class GenerateUniqueValuesTests(TestCase):
+
+    def test_skips_taken_and_excluded_values(self):
+        # ความยาว 1 หลักมีแค่ 10 ค่า: 0-6 อยู่ในฐานข้อมูล 7 อยู่ใน exclude จึงเหลือ 8 และ 9
+        for digit in range(7):
+            Person.objects.create(name=f'p{digit}', degree='d', nisit=str(digit))
+
+        values = Person.generate_unique_values(2, 1, Person, 'nisit', exclude={'7'})
+
+        self.assertEqual(sorted(values), ['8', '9'])
+
+    def test_one_query_per_batch(self):
+        with self.assertNumQueries(3):
+            values = Person.generate_unique_values(5, 11, Person, 'nisit', batch_size=2)
+
+        self.assertEqual(len(set(values)), 5)
+        self.assertTrue(all(len(value) == 11 and value.isdigit() for value in values))
+
+
+HEADERS = ['รหัสนิสิต', 'ชื่อ-นามสกุล', 'ชื่อปริญญา', 'ที่นั่ง', 'สถานะรายงานตัว', 'รหัส RFID']
+
+
+def person_dataset(*rows):
+    return Dataset(*rows, headers=HEADERS)
+
+
+class PersonResourceTests(TestCase):
+
+    def test_before_import_fills_blank_nisit(self):
+        Person.objects.create(name='old', degree='d', nisit='11111111111')
+        dataset = person_dataset(
+            ('', 'a', 'd', '', 0, ''),
+            ('22222222222', 'b', 'd', '', 0, ''),
+            (None, 'c', 'd', '', 0, ''),
+            ('  ', 'e', 'd', '', 0, ''),
+        )
+
+        with self.assertNumQueries(1):
+            PersonResource().before_import(dataset)
+
+        nisits = dataset['รหัสนิสิต']
+        self.assertEqual(nisits[1], '22222222222')
+        self.assertEqual(dataset['ชื่อ-นามสกุล'], ['a', 'b', 'c', 'e'])
+        self.assertEqual(len(set(nisits)), 4)
+        self.assertNotIn('11111111111', nisits)
+        self.assertTrue(all(len(value) == 11 and value.isdigit() for value in nisits))
+
+    def test_before_import_without_blanks_is_untouched(self):
+        dataset = person_dataset(('22222222222', 'b', 'd', '', 0, ''))
+
+        with self.assertNumQueries(0):
+            PersonResource().before_import(dataset)
+
+        self.assertEqual(dataset.headers, HEADERS)
+
+
+class ImportPersonsTests(CounterTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.existing = self.make_person('old name', nisit='6500000001', seat=5, rfid='E-OLD')
+        stats_counter.reseed()
+        epc_index.lookup([])
+
+    def run_import(self, dataset):
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_persons(dataset)
+
+    def test_counts_new_and_updated_rows(self):
+        totals = self.run_import(person_dataset(
+            ('6500000001', 'new name', 'd', 5, 1, 'E-OLD'),
+            ('6500000002', 'b', 'd', None, 0, None),
+            ('6500000003', 'c', 'd', None, 2, 'E-C'),
+        ))
+
+        self.assertEqual(totals, {'new': 2, 'update': 1})
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.current_status), ('new name', 1))
+        self.assertEqual(epc_index.peek('E-C').current_status, 2)
+        self.assertCountersMatch()
+
+    def test_reserves_seats_after_explicit_ones(self):
+        self.run_import(person_dataset(
+            ('6500000002', 'b', 'd', None, 0, None),
+            ('6500000003', 'c', 'd', 30, 0, None),
+            ('6500000004', 'd', 'd', None, 0, None),
+        ))
+
+        seats = dict(Person.objects.values_list('nisit', 'seat'))
+        self.assertEqual((seats['6500000002'], seats['6500000004']), (31, 32))
+        self.assertEqual(Person.objects.create(name='e', degree='d').seat, 33)
+
+    def test_rejects_file_with_invalid_or_conflicting_rows(self):
+        with self.assertRaises(ImportRowsError) as raised:
+            self.run_import(person_dataset(
+                ('6500000001', 'new name', 'd', 5, 1, 'E-OLD'),
+                ('6500000002', 'b', 'd', None, 7, None),
+                ('6500000003', 'c', 'd', 5, 0, None),
+                ('6500000004', 'd', 'd', None, 0, 'E-D'),
+                ('6500000005', 'e', 'd', None, 0, 'E-D'),
+            ))
+
+        self.assertEqual([error.split(':')[0] for error in raised.exception.errors], ['แถวที่ 2', 'แถวที่ 3', 'แถวที่ 5'])
+        # ทั้งไฟล์ไม่ถูกบันทึก รวมถึงแถวที่ถูกต้อง
+        self.assertEqual(list(Person.objects.values_list('nisit', 'name')), [('6500000001', 'old name')])
+        self.assertEqual(SeatCounter.objects.get().next_value, 6)
+        self.assertCountersMatch()
+
+    def test_fills_blank_nisit(self):
+        totals = self.run_import(person_dataset(('', 'b', 'd', None, 0, None)))
+
+        self.assertEqual(totals['new'], 1)
+        self.assertEqual(len(Person.objects.get(name='b').nisit), 11)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [(f'65{i:08d}', f'p{i}', 'd', None, 0, f'E-{i}') for i in range(10, 60)]
+        # ไม่ขึ้นกับจำนวนแถว: อ่านคนเดิม, ตรวจที่นั่ง/RFID, จองที่นั่งเป็นช่วง, INSERT ชุดเดียว และตัวนับ/เวอร์ชัน
+        with self.assertNumQueries(14):
+            self.run_import(person_dataset(*rows))
+        self.assertEqual(Person.objects.count(), 51)
+
+
+class ImportPathParityTests(CounterTestCase):
+    """ทางนำเข้า bulk และทีละแถว (IMPORT_BULK_ENABLED=False) ต้องให้ผลแบบเดียวกัน"""
+
+    GOOD = (
+        ('6500000001', 'new name', 'd', 5, 1, None),
+        ('6500000002', 'b', 'd', 6, 0, None),
+    )
+    BAD = (
+        ('6500000001', 'new name', 'd', 5, 1, None),
+        ('6500000002', 'b', 'd', None, 7, None),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.make_person('old name', nisit='6500000001', seat=5)
+        stats_counter.reseed()
+
+    def run_both(self, rows):
+        outcomes = []
+        for import_rows in (import_persons, import_persons_by_row):
+            with self.subTest(import_rows=import_rows.__name__):
+                try:
+                    # ย้อนผลหลังตรวจ เพื่อให้อีกทางเริ่มจากข้อมูลเดียวกัน
+                    with transaction.atomic():
+                        with self.captureOnCommitCallbacks(execute=True):
+                            outcomes.append(import_rows(person_dataset(*rows)))
+                        self.assertCountersMatch()
+                        transaction.set_rollback(True)
+                except ImportRowsError as e:
+                    outcomes.append(e.errors)
+                self.assertEqual(list(Person.objects.values_list('nisit', 'name')), [('6500000001', 'old name')])
+        return outcomes
+
+    def test_good_file(self):
+        self.assertEqual(self.run_both(self.GOOD), [{'new': 1, 'update': 1}] * 2)
+
+    def test_bad_row_rejects_whole_file(self):
+        bulk, by_row = self.run_both(self.BAD)
+
+        self.assertEqual(bulk, by_row)
+        self.assertEqual(len(bulk), 1)
+        self.assertTrue(bulk[0].startswith('แถวที่ 2:'))
+        self.assertCountersMatch()
+
+    def test_view_answers_400_with_row_errors(self):
+        try:
+            content = person_dataset(*self.BAD).export('xlsx')
+        except UnsupportedFormat:
+            self.skipTest('openpyxl ไม่ได้ติดตั้ง')
+        response = self.client.post('/api/import/', {'file': SimpleUploadedFile('persons.xlsx', content)})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 1)
+        self.assertEqual(Person.objects.get().name, 'old name')
@@ -1,11 +1,14 @@
 from django.urls import path
-from .views import PersonList, PersonDetail, StatsView, ExportData, ImportData, ExportPDF, ExportPDFResult, ResetDatabase, RFIDSimulator, LogList, ResetLog, LogCreateView
+from .views import PersonList, PersonChanges, PersonDetail, StatsView, StatsBreakdownView, StatsArrivalsView, ExportData, ImportData, ExportPDF, ExportPDFResult, ResetDatabase, RFIDSimulator, RFIDIngest, RFIDMetrics, LogList, ResetLog, LogCreateView
 from . import views
 
 urlpatterns = [
     path('person/', PersonList.as_view(), name='person-list'),
+    path('person/changes/', PersonChanges.as_view(), name='person-changes'),
     path('person/<int:pk>/', PersonDetail.as_view(), name='person-detail'),
     path('stats/', StatsView.as_view(), name='stats'),
+    path('stats/breakdown/', StatsBreakdownView.as_view(), name='stats-breakdown'),
+    path('stats/arrivals/', StatsArrivalsView.as_view(), name='stats-arrivals'),
     path('person/delete/', PersonList.as_view(), name='person-delete'),
     path('export/<str:format_type>/', ExportData.as_view()),
     path('import/', ImportData.as_view()),
@@ -14,6 +17,8 @@ urlpatterns = [
     path('reset/', ResetDatabase.as_view(), name='reset-database'),
     path('resetlog/', ResetLog.as_view(), name='reset-log'),
     path('rfidAPI/', RFIDSimulator.as_view(), name='rfid_api'),
+    path('rfidAPI/ingest/', RFIDIngest.as_view(), name='rfid_ingest'),
+    path('rfidAPI/metrics/', RFIDMetrics.as_view(), name='rfid_metrics'),
     path('logs/', LogList.as_view(), name='log-list'),
     path('logs/new/', LogCreateView.as_view(), name='log-create'),
     path("get-csrf-token/", views.get_csrf_token, name="get_csrf_token"),
@@ -0,0 +1,62 @@
+import time
+from django.db import transaction
+from .models import SharedCounter
+
+# เลขเวอร์ชันของข้อมูล Person ใช้ทำ ETag ของ /api/person/, /api/stats/ และ /api/person/<pk>/
+# เก็บใน SharedCounter เพื่อให้การเขียนจากทุกโปรเซส (worker อื่น, manage.py) เปลี่ยน ETag ด้วย
+DATA_VERSION_KEY = 'person_data:version'
+
+
+def _initial_version():
+    # เริ่มจากเวลาปัจจุบัน เพื่อไม่ให้ซ้ำกับ ETag เดิมที่ browser ถือไว้เมื่อแถวถูกลบ
+    return int(time.time() * 1000)
+
+
+def data_version():
+    version = SharedCounter.get_values([DATA_VERSION_KEY]).get(DATA_VERSION_KEY)
+    if version is None:
+        version = SharedCounter.objects.get_or_create(
+            name=DATA_VERSION_KEY, defaults={'value': _initial_version()}
+        )[0].value
+    return version
+
+
+def bump_data_version():
+    """เลื่อนเวอร์ชันแล้วคืนค่าเวอร์ชันใหม่
+
+    อ่านกลับใน transaction เดียวกับ UPDATE แถวยังถูกล็อกอยู่ ค่าที่ได้จึงเป็นของการเลื่อนครั้งนี้พอดี
+    """
+    with transaction.atomic():
+        if SharedCounter.add({DATA_VERSION_KEY: 1}):
+            return SharedCounter.get_values([DATA_VERSION_KEY])[DATA_VERSION_KEY]
+        version = _initial_version()
+        SharedCounter.set_values({DATA_VERSION_KEY: version})
+        return version
+
+
+def person_data_changed():
+    """เรียกหลัง commit ทุกครั้งที่ข้อมูล Person เปลี่ยน: เลื่อนเวอร์ชัน (cache ที่ขึ้นกับข้อมูลใช้เวอร์ชันเป็นส่วนของ key)
+
+    คืนค่าเวอร์ชันใหม่ ใช้กับ epc_index.advance() เมื่อโปรเซสนี้ปรับดัชนีตามการเขียนของตัวเองแล้ว
+    """
+    return bump_data_version()
+
+
+def persons_bulk_changed(entries, deltas, unbound_ids=()):
+    """ใช้หลังเขียน Person แบบ bulk (update/bulk_create/bulk_update) ซึ่งไม่ส่ง signal
+
+    หลัง commit จะปรับดัชนี EPC ตัวนับสถิติ และเวอร์ชันข้อมูล แบบเดียวกับที่ api/signals.py ทำทีละแถว
+    entries: dict epc -> EPCEntry ของแถวที่เปลี่ยน  deltas: current_status -> จำนวนที่เพิ่ม/ลด
+    unbound_ids: id ของคนที่ไม่มี EPC แล้ว (ถอด RFID ออกหรือถูกลบ)
+    """
+    from .epc_index import epc_index
+    from .stats import stats_counter
+
+    def refresh():
+        for pk in unbound_ids:
+            epc_index.remove_person(pk)
+        epc_index.store(entries)
+        stats_counter.apply(deltas)
+        epc_index.advance(person_data_changed())
+
+    transaction.on_commit(refresh)
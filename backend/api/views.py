@@ -2,18 +2,21 @@ from django.http import HttpResponse, JsonResponse
 from django.conf import settings
 from django.db import transaction, connection
 from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
+from django.utils.decorators import method_decorator
 from django.db.models import Q
 from django.contrib.auth import authenticate, login, logout
-from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.http import require_POST, require_GET, condition
 from django.contrib.auth.decorators import login_required
 from tablib import Dataset
 from rest_framework.views import APIView, View
 from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework import status, generics
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
@@ -23,15 +26,31 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from datetime import datetime
 from .resources import PersonResource
-from .consumers import broadcast_to_crud01, broadcast_stats_update, broadcast_ws
-from .models import Person, Log
-from .serializers import PersonSerializer, LogSerializer
-from datetime import datetime
+from .importer import ImportRowsError, import_persons, import_persons_by_row
+from .consumers import broadcast_to_crud01, broadcast_bulk_update, broadcast_bulk_delete, broadcast_ws
+from .bulk import VERIFIED_FIELDS, bulk_set_verified, delete_persons
+from .signals import bulk_person_delete
+from .broadcaster import stats_broadcaster
+from .models import Person, Log, ScanEvent, PersonTombstone, SeatCounter
+from .rfid import SCAN_PAYLOAD_ERROR, parse_scan_payload, process_tags, broadcast_scan_updates
+from .ingest import scan_queue
+from .filters import filter_persons
+from .renderers import FastJSONRenderer
+from .epc_index import epc_index
+from .debounce import scan_debouncer
+from .stats import person_stats, stats_counter, degree_breakdown, arrivals, ARRIVALS_MAX_MINUTES
+from .versioning import data_version, person_data_changed
+from .serializers import PersonSerializer, LogSerializer, person_to_dict, person_values, person_rows, datetime_to_str, convert_datetime_fields
+from datetime import datetime, timedelta, timezone as dt_timezone
 from urllib.parse import quote
 import urllib.parse
 import os, io
+import hashlib
+import json
 import logging
 
+logger = logging.getLogger(__name__)
+
 # ✅ แจก CSRF token (frontend ต้องเรียกก่อน)
 @ensure_csrf_cookie
 def get_csrf_token(request):
@@ -41,7 +60,6 @@ def get_csrf_token(request):
 # ✅ Login
 @require_POST
 def login_view(request):
-    import json
     data = json.loads(request.body)
     username = data.get("username")
     password = data.get("password")
@@ -72,6 +90,45 @@ def profile_view(request):
         "nickname": request.user.profile.nickname if hasattr(request.user, 'profile') else '',
     })
 
+def _person_json_chunk(persons, last_id, chunk_size):
+    """ดึงช่วงถัดจาก last_id (keyset) คืนค่า (last_id ใหม่, JSON ของแถวโดยไม่มี [ ]) หรือ (last_id, None) ถ้าหมดแล้ว
+
+    ไม่ใช้ QuerySet.iterator() เพราะไดรเวอร์ MySQL โหลดผลลัพธ์ทั้งหมดเข้าหน่วยความจำอยู่ดี
+    """
+    chunk = list(persons.filter(id__gt=last_id).order_by('id')[:chunk_size])
+    if not chunk:
+        return last_id, None
+    return chunk[-1]['id'], FastJSONRenderer().render(person_rows(chunk))[1:-1]
+
+def stream_person_json(persons, chunk_size):
+    """สร้าง JSON array ของ person_rows() ทีละช่วง ใช้หน่วยความจำคงที่ไม่ว่าจะมีกี่คน (สำหรับ WSGI)"""
+    yield b'['
+    last_id, separator = 0, b''
+    while True:
+        last_id, body = _person_json_chunk(persons, last_id, chunk_size)
+        if body is None:
+            break
+        yield separator + body
+        separator = b','
+    yield b']'
+
+async def astream_person_json(persons, chunk_size):
+    """แบบ async ของ stream_person_json() สำหรับ ASGI
+
+    StreamingHttpResponse ภายใต้ ASGI จะรวม iterator แบบ sync เป็น list ทั้งก้อนก่อนส่ง
+    จึงต้องดึงแต่ละช่วงผ่าน sync_to_async แล้ว yield ทีละช่วงเอง
+    """
+    fetch = sync_to_async(_person_json_chunk)
+    yield b'['
+    last_id, separator = 0, b''
+    while True:
+        last_id, body = await fetch(persons, last_id, chunk_size)
+        if body is None:
+            break
+        yield separator + body
+        separator = b','
+    yield b']'
+
 def file_iterator(buffer, chunk_size=8192):
     buffer.seek(0)
     while True:
@@ -87,8 +144,17 @@ class ResetDatabase(APIView):
                 # 1. บันทึกจำนวนข้อมูลก่อนลบ (Option)
                 total_records = Person.objects.count()
                 
-                # 2. ลบข้อมูลทั้งหมด
-                Person.objects.all().delete()
+                # 2. ลบข้อมูลทั้งหมด (รวมประวัติการสแกน เพราะ id จะถูกนับใหม่)
+                # ไม่ต้องมี tombstone รายคน ดัชนี EPC ล้างทั้งหมดหลัง commit
+                with bulk_person_delete():
+                    Person.objects.all().delete()
+                transaction.on_commit(epc_index.clear)
+                ScanEvent.objects.all().delete()
+                # tombstone รายคนไม่จำเป็นแล้ว เหลือไว้แค่เครื่องหมายรีเซ็ต
+                PersonTombstone.objects.all().delete()
+                PersonTombstone.objects.create(person_id=None)
+                # ที่นั่งเริ่มนับ 1 ใหม่
+                SeatCounter.reset()
                 
                 # 3. รีเซ็ต AUTO_INCREMENT (MySQL/MariaDB)
                 reset_auto_increment = False
@@ -110,7 +176,10 @@ class ResetDatabase(APIView):
                     record_id=None
                 )
                 broadcast_ws("reset")
-                broadcast_stats_update()
+                # นับใหม่หลัง commit (หลัง delta จาก signal ตอนลบ) แล้วค่อยส่งสถิติ
+                transaction.on_commit(stats_counter.reseed)
+                transaction.on_commit(person_data_changed)
+                transaction.on_commit(stats_broadcaster.mark_dirty)
                 return Response(
                     {'success': 'รีเซ็ตฐานข้อมูลสำเร็จ'}, 
                     status=status.HTTP_200_OK
@@ -539,47 +608,10 @@ class ExportPDFResult(View):
             width, height = A4
             p.setFont('THSarabun', 25)
 
-            def degree_group(name):
-                if 'ดุษฎีบัณฑิต' in name:
-                    return 'ป.เอก'
-                elif 'มหาบัณฑิต' in name:
-                    return 'ป.โท'
-                return 'ป.ตรี'
-
-            def is_verified(person):
-                # ถ้ามี verified1,2 หรือ 3 เป็น 1 หรือ 2 ถือว่า มา
-                return any(getattr(person, f'verified{i}') in [1, 2] for i in range(1, 4))
-
-
-            persons = Person.objects.all()
-
-            degree_summary = {
-                'ป.ตรี': {'total': 0, 'present': 0},
-                'ป.โท': {'total': 0, 'present': 0},
-                'ป.เอก': {'total': 0, 'present': 0},
-            }
-
-            branch_summary = {}
-
-            # เก็บ id ที่ยังไม่รายงานตัว
-            missing_ids = []
-
-            for person in persons:
-                dg = degree_group(person.degree)
-                degree_summary[dg]['total'] += 1
-
-                if is_verified(person):
-                    degree_summary[dg]['present'] += 1
-                else:
-                    missing_ids.append(person.id)
-
-                branch = person.degree if person.degree else 'ไม่ระบุ'
-                if branch not in branch_summary:
-                    branch_summary[branch] = {'total': 0, 'present': 0}
-                branch_summary[branch]['total'] += 1
-
-                if is_verified(person):
-                    branch_summary[branch]['present'] += 1
+            # ใช้ข้อมูลสรุปชุดเดียวกับ /api/stats/breakdown/ (GROUP BY ครั้งเดียว ผ่าน cache)
+            breakdown = degree_breakdown()
+            degree_summary = {row['level']: row for row in breakdown['levels']}
+            branch_summary = {row['degree']: row for row in breakdown['degrees']}
 
             p.setFont('THSarabun', 25)
             date_str = datetime.now().strftime("%d/%m/%Y")
@@ -761,7 +793,6 @@ class ImportData(APIView):
     def post(self, request):
         file = request.FILES['file']
         dataset = Dataset()
-        resource = PersonResource()
 
         try:
             # อ่านไฟล์
@@ -774,24 +805,28 @@ class ImportData(APIView):
             if len(dataset) == 0:
                 raise ValueError("ไฟล์ที่อัปโหลดว่างเปล่า")
 
-            # นำเข้าข้อมูล
-            result = resource.import_data(dataset, dry_run=False)
+            # นำเข้าข้อมูล (bulk หรือทีละแถวผ่าน django-import-export)
+            # ถ้ามีแถวใดไม่ถูกต้อง ทั้งสองทางปฏิเสธทั้งไฟล์ (ImportRowsError) ไม่มีแถวใดถูกบันทึก
+            if getattr(settings, 'IMPORT_BULK_ENABLED', True):
+                totals = import_persons(dataset)
+            else:
+                totals = import_persons_by_row(dataset)
             
             # แก้ไขการนับจำนวนรายการ
             imported_count = (
-                result.totals.get('new', 0)    # ข้อมูลใหม่
-                + result.totals.get('update', 0)  # ข้อมูลที่อัปเดต
+                totals.get('new', 0)    # ข้อมูลใหม่
+                + totals.get('update', 0)  # ข้อมูลที่อัปเดต
             )
 
             # บันทึก Log
             Log.objects.create(
                 action='Import',
                 model='Person',
-                details=f"นำเข้าฐานข้อมูล {imported_count} รายการ ( ใหม่ {result.totals.get('new', 0)} อัปเดต {result.totals.get('update', 0)} )",
+                details=f"นำเข้าฐานข้อมูล {imported_count} รายการ ( ใหม่ {totals.get('new', 0)} อัปเดต {totals.get('update', 0)} )",
                 record_id=None
             )
             broadcast_ws("upload")
-            broadcast_stats_update()
+            stats_broadcaster.mark_dirty()
             return Response(
                 {'success': f'นำเข้าข้อมูลสำเร็จ {imported_count} รายการ'}, 
                 status=status.HTTP_201_CREATED
@@ -805,54 +840,91 @@ class ImportData(APIView):
                 record_id=None
             )
             logger.error(f"Import failed: {str(e)}", exc_info=True)
+            data = {'error': str(e)}
+            if isinstance(e, ImportRowsError):
+                data['errors'] = e.errors
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+# ETag จากเลขเวอร์ชันข้อมูล (api/versioning.py) ตอบ 304 ได้โดยไม่ต้อง query ตาราง Person
+def person_list_etag(request, *args, **kwargs):
+    # แต่ละหน้า/ตัวกรองได้ ETag ต่างกัน
+    query = hashlib.md5(request.GET.urlencode().encode('utf-8')).hexdigest()[:12]
+    return f"persons-{data_version()}-{query}"
+
+def stats_etag(request, *args, **kwargs):
+    return f"stats-{data_version()}"
+
+def person_detail_etag(request, pk, *args, **kwargs):
+    return f"person-{pk}-{data_version()}"
+
+class StatsView(APIView):
+    @method_decorator(condition(etag_func=stats_etag))
+    def get(self, request):
+        return Response(person_stats(), status=200)
+
+class StatsBreakdownView(APIView):
+    # สรุปจำนวนมา/ขาดแยกตามระดับและปริญญา (ข้อมูลเดียวกับใบสรุปผล PDF)
+    def get(self, request):
+        return Response(degree_breakdown(), status=200)
+
+class StatsArrivalsView(APIView):
+    # จำนวนการสแกนต่อนาทีแยกตามเครื่องอ่าน/ทิศทาง ?minutes=60&scanner_id=1
+    def get(self, request):
+        try:
+            minutes = int(request.query_params.get('minutes', 60))
+            scanner_id = request.query_params.get('scanner_id')
+            scanner_id = int(scanner_id) if scanner_id else None
+        except ValueError:
+            return Response({'error': 'minutes and scanner_id must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= minutes <= ARRIVALS_MAX_MINUTES or scanner_id not in [None, 1, 2, 3]:
             return Response(
-                {'error': str(e)}, 
+                {'error': f'minutes must be 1-{ARRIVALS_MAX_MINUTES} and scanner_id 1-3'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(arrivals(minutes, scanner_id), status=200)
 
-class StatsView(APIView):
-    def get(self, request):
-        from collections import Counter
-        verified_counter = Counter()
-        persons = Person.objects.all()
-        total = persons.count()
-
-        for person in persons:
-            verified_with_time = []
-            for i in range(1, 4):
-                value = getattr(person, f'verified{i}', None)
-                timestamp = getattr(person, f'verified_updated_at{i}', None)
-                if value in [0, 1, 2]:
-                    # ถ้า timestamp ไม่มี ให้ใช้วันที่เก่ามากๆ แทน เพื่อให้ไม่เลือกก่อน timestamp อื่น
-                    if not timestamp:
-                        timestamp = datetime.min.replace(tzinfo=timezone.utc)
-                    verified_with_time.append((timestamp, value))
-
-            if verified_with_time:
-                latest_value = sorted(verified_with_time, reverse=True)[0][1]
-                verified_counter[latest_value] += 1
-
-        stats = {
-            'total': total,
-            'checked_in': verified_counter[0],
-            'in_checkin_room': verified_counter[1],
-            'in_graduation_room': verified_counter[2],
-        }
-        return Response(stats, status=200)
+class PersonCursorPagination(CursorPagination):
+    """แบ่งหน้าแบบ keyset ตาม seat หรือ id (ไม่ซ้ำทั้งคู่ ลำดับจึงคงที่)
+
+    ?ordering=seat|-seat|id|-id  ?page_size=...  แล้วตาม cursor ใน next/previous
+    """
+    page_size = getattr(settings, 'PERSON_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+    ordering_fields = ['seat', '-seat', 'id', '-id']
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering', self.ordering)
+        if ordering not in self.ordering_fields:
+            ordering = self.ordering
+        return (ordering,)
 
 class PersonList(APIView):
+    @method_decorator(condition(etag_func=person_list_etag))
     def get(self, request):
-        persons = Person.objects.all()
-        serializer = PersonSerializer(persons, many=True)
-        # ตรวจสอบข้อมูลก่อนส่ง response
-        safe_data = []
-        for item in serializer.data:
-            safe_item = {
-                k: v for k, v in item.items() 
-                if isinstance(v, (str, int, float, bool, type(None)))
-            }
-            safe_data.append(safe_item)
-        return Response(safe_data, status=status.HTTP_200_OK)
+        persons, errors = filter_persons(Person.objects.all(), request.query_params)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        persons = person_values(persons)
+
+        # ?stream=true ส่งทั้งหมดแบบทยอยส่ง ได้ไบต์แรกทันทีและใช้หน่วยความจำคงที่
+        if request.query_params.get('stream', '').lower() in ['1', 'true', 'yes']:
+            chunk_size = getattr(settings, 'PERSON_STREAM_CHUNK_SIZE', 2000)
+            # ต้องใช้ iterator ชนิดเดียวกับเซิร์ฟเวอร์ ไม่เช่นนั้น Django จะรวมทั้งหมดเป็น list ก่อนส่ง
+            if isinstance(request._request, ASGIRequest):
+                content = astream_person_json(persons, chunk_size)
+            else:
+                content = stream_person_json(persons, chunk_size)
+            return StreamingHttpResponse(content, content_type='application/json')
+
+        # ?all=true คืนข้อมูลทั้งหมดในครั้งเดียวแบบเดิม (เหมาะกับงานที่มีคนไม่มาก)
+        if request.query_params.get('all', '').lower() in ['1', 'true', 'yes']:
+            return Response(person_rows(persons.order_by('id')), status=status.HTTP_200_OK)
+
+        paginator = PersonCursorPagination()
+        page = paginator.paginate_queryset(persons, request, view=self)
+        return paginator.get_paginated_response(person_rows(page))
     
     def post(self, request):
         serializer = PersonSerializer(data=request.data)
@@ -879,7 +951,7 @@ class PersonList(APIView):
                         'rfid': instance.rfid,
                     }
                 })
-                broadcast_stats_update()
+                stats_broadcaster.mark_dirty()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -891,33 +963,20 @@ class PersonList(APIView):
         if not ids or not verified_field:
             return Response({'error': 'ข้อมูลไม่ครบ'}, status=400)
 
-        persons = Person.objects.filter(id__in=ids)
-        now = timezone.localtime(timezone.now())
-
-        updated_ids = []
-        updated_values = set()  # เก็บค่าใหม่ที่อัปเดต (เช่น 0,1,2)
-        
-        for person in persons:
-            original_val = getattr(person, verified_field)
+        if verified_field not in VERIFIED_FIELDS:
+            return Response({'error': f'verified_field ต้องเป็น {", ".join(VERIFIED_FIELDS)}'}, status=400)
+        try:
             new_val = int(verified)
-            if original_val != new_val:
-                setattr(person, verified_field, new_val)
-                updated_field = verified_field.replace('verified', 'verified_updated_at')
-                setattr(person, updated_field, now)
-                person.save()
-
-                updated_ids.append(str(person.id))   # เก็บเป็น string เพื่อ join ทีหลัง
-                updated_values.add(str(new_val))     # เก็บค่าใหม่ (ไม่ซ้ำ)
-                if settings.USE_CHANNEL: 
-                    fields = person_to_dict(person)
-                    fields = convert_datetime_fields(fields, [
-                        'verified_updated_at1', 'verified_updated_at2', 'verified_updated_at3'
-                    ])
-                    broadcast_to_crud01({
-                        'action': 'update',
-                        'id': person.id,
-                        'fields': fields,
-                    })
+        except (TypeError, ValueError):
+            return Response({'error': 'verified ต้องเป็นตัวเลข'}, status=400)
+
+        # UPDATE เดียวเฉพาะแถวที่ค่ายังไม่ตรง แล้วส่ง WebSocket ครั้งเดียวทั้งชุด
+        changed_ids, changes = bulk_set_verified(ids, verified_field, new_val)
+        updated_ids = [str(pk) for pk in changed_ids]   # เก็บเป็น string เพื่อ join ทีหลัง
+        updated_values = {str(new_val)}
+
+        if settings.USE_CHANNEL and changes:
+            broadcast_bulk_update(changes)
 
         if updated_ids:
             # สร้างข้อความ log แบบที่ต้องการ
@@ -930,8 +989,8 @@ class PersonList(APIView):
                 record_id=None  # เพราะหลาย id
             )
 
-        if settings.USE_CHANNEL:
-            broadcast_stats_update()
+        if changes:
+            stats_broadcaster.mark_dirty()
 
         return Response({
             'updated_count': len(updated_ids),
@@ -946,31 +1005,64 @@ class PersonList(APIView):
 
         try:
             with transaction.atomic():
-                persons = Person.objects.filter(id__in=ids)
-                # เก็บ ID ก่อนลบ
-                ids_str = ','.join(str(p.id) for p in persons)
+                # tombstone ด้วย INSERT เดียว ไม่ใช่ทีละแถวผ่าน signal
+                deleted_ids = delete_persons(Person.objects.filter(id__in=ids))
+                ids_str = ','.join(str(pk) for pk in deleted_ids)
                 Log.objects.create(
                     action='Delete',
                     model='Person',
                     details=f"[ID: {ids_str}] ลบข้อมูลแบบกลุ่ม",
                     record_id=None
                 )
-                persons.delete()
                 
-                # ส่ง WebSocket สำหรับแต่ละ ID
+                # ส่ง WebSocket ครั้งเดียวทั้งชุดหลัง commit
                 if settings.USE_CHANNEL:
-                    for id in ids:
-                        broadcast_to_crud01({
-                            'action': 'delete',
-                            'id': id,
-                        })
-                    broadcast_stats_update()
+                    transaction.on_commit(lambda: broadcast_bulk_delete(deleted_ids))
+                    transaction.on_commit(stats_broadcaster.mark_dirty)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class PersonChanges(APIView):
+    """รายการ Person ที่เปลี่ยนหรือถูกลบหลัง token ที่ได้จากครั้งก่อน (?since=<token>)
+
+    ถ้าไม่มี token, มีการรีเซ็ตฐานข้อมูล หรือมีการเปลี่ยนแปลงมากเกิน PERSON_SYNC_MAX_CHANGES
+    จะตอบ reset: true ให้ผู้ใช้โหลดรายชื่อทั้งหมดใหม่ แล้วใช้ token ที่ได้ครั้งนี้ต่อไป
+    token ที่เก่ากว่าระยะเก็บ tombstone ตอบ 410 พร้อม reset: true และ token ใหม่ในรูปแบบเดียวกัน
+    """
+    def get(self, request):
+        now = timezone.now()
+        token = str(int(now.timestamp() * 1_000_000))
+        since_token = request.query_params.get('since')
+        if not since_token:
+            return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []}, status=status.HTTP_200_OK)
+        try:
+            since = datetime.fromtimestamp(int(since_token) / 1_000_000, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            return Response({'error': 'invalid since token'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ย้อนเผื่อ transaction ที่ commit ช้ากว่าเวลาที่เขียน (อาจได้แถวซ้ำ ผู้ใช้รวมทับได้)
+        since -= timedelta(seconds=getattr(settings, 'PERSON_SYNC_OVERLAP_SECONDS', 5))
+        max_changes = getattr(settings, 'PERSON_SYNC_MAX_CHANGES', 5000)
+
+        # tombstone ที่เก่ากว่าระยะเก็บถูกล้างไปแล้ว จึงไม่รู้ว่าใครถูกลบไปบ้าง
+        if since < PersonTombstone.cutoff(now):
+            return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []}, status=status.HTTP_410_GONE)
+
+        tombstones = PersonTombstone.objects.filter(deleted_at__gte=since)
+        changed = person_rows(
+            person_values(Person.objects.filter(updated_at__gte=since).order_by('id'))[:max_changes + 1]
+        )
+        reset = len(changed) > max_changes or tombstones.filter(person_id__isnull=True).exists()
+        if reset:
+            return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []}, status=status.HTTP_200_OK)
+
+        deleted = sorted(set(tombstones.values_list('person_id', flat=True)))
+        return Response({'token': token, 'reset': False, 'changed': changed, 'deleted': deleted}, status=status.HTTP_200_OK)
+
 class PersonDetail(APIView):
+    @method_decorator(condition(etag_func=person_detail_etag))
     def get(self, request, pk):
         try:
             person = Person.objects.get(pk=pk)
@@ -1000,7 +1092,7 @@ class PersonDetail(APIView):
                     'action': 'delete',
                     'id': person_id,
                 })
-                broadcast_stats_update()
+                stats_broadcaster.mark_dirty()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Person.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
@@ -1037,7 +1129,7 @@ class PersonDetail(APIView):
                         'id': person.id,
                         'fields': fields,
                     })
-                    broadcast_stats_update()
+                    stats_broadcaster.mark_dirty()
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Person.DoesNotExist:
@@ -1047,87 +1139,58 @@ class RFIDSimulator(APIView):
     parser_classes = [JSONParser]
     def post(self, request):
         try:
-            simulated_tags = request.data.get('tags', [])
-            scanner_type = request.data.get('scanner_type')  # 'in' or 'out'
-            scanner_id = request.data.get('scanner_id')       # 1, 2, or 3
-
-            try:
-                scanner_id = int(scanner_id)
-            except (TypeError, ValueError):
-                scanner_id = None
-
-            if not simulated_tags or scanner_type not in ['in', 'out'] or scanner_id not in [1, 2, 3]:
+            payload = parse_scan_payload(request.data)
+            if payload is None:
                 return Response(
-                    {'error': 'Missing tags or invalid scanner_type (in/out) or scanner_id (1-3)'},
+                    {'error': SCAN_PAYLOAD_ERROR},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            simulated_tags, scanner_type, scanner_id = payload
 
-            results = []
-
-            for tag in simulated_tags:
-                epc = tag.get('epc')
-                if not epc:
-                    continue
-                try:
-                    person = Person.objects.get(rfid=epc)
-
-                    verified_field = f"verified{scanner_id}"
-                    time_field = f"verified_updated_at{scanner_id}"
-                    current_status = getattr(person, verified_field, 0)
-                    verified_value = 2 if scanner_type == 'out' else 1
-
-                    if current_status == verified_value:
-                        results.append(f"rfid: {epc} name: {person.name} status: แท็กนี้ถูกแสกนแล้ว")
-                    else:
-                        setattr(person, verified_field, verified_value)
-                        setattr(person, time_field, timezone.now())
-                        person.save()
-
-                        if settings.USE_CHANNEL:
-                            broadcast_to_crud01({
-                                'action': 'update',
-                                'id': person.id,
-                                'fields': person_to_dict(person),
-                                'scanner_type': scanner_type,
-                            })
-                            broadcast_stats_update()
-
-                        results.append(f"rfid: {epc} name: {person.name} status: อัปเดตสถานะสำเร็จ")
-
-                except Person.DoesNotExist:
-                    person_with_empty_rfid = Person.objects.filter(rfid__isnull=True).first()
-                    if not person_with_empty_rfid:
-                        person_with_empty_rfid = Person.objects.filter(rfid='').first()
-
-                    if not person_with_empty_rfid:
-                        results.append(f"rfid: {epc} name: null status: ไม่พบข้อมูลในระบบ")
-                    else:
-                        person_with_empty_rfid.rfid = epc
-
-                        verified_field = f"verified{scanner_id}"
-                        time_field = f"verified_updated_at{scanner_id}"
-
-                        verified_value = 2 if scanner_type == 'out' else 1
-                        setattr(person_with_empty_rfid, verified_field, verified_value)
-                        setattr(person_with_empty_rfid, time_field, timezone.now())
-                        person_with_empty_rfid.save()
-
-                        if settings.USE_CHANNEL:
-                            broadcast_to_crud01({
-                                'action': 'update',
-                                'id': person_with_empty_rfid.id,
-                                'fields': person_to_dict(person_with_empty_rfid),
-                                'scanner_type': scanner_type,
-                            })
-                            broadcast_stats_update()
+            results, changes = process_tags(simulated_tags, scanner_type, scanner_id)
 
-                        results.append(f"epc: {epc} name: {person_with_empty_rfid.name} status: เพิ่มรหัส RFID สำเร็จและอัปเดตสถานะแล้ว")
+            if settings.USE_CHANNEL and changes:
+                broadcast_scan_updates(changes, scanner_type)
+                stats_broadcaster.mark_dirty()
 
             return Response({'results': results}, status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+@method_decorator(csrf_exempt, name='dispatch')
+class RFIDIngest(View):
+    # endpoint แบบ async: ตอบรับทันทีแล้วให้ writer เบื้องหลังเขียนลงฐานข้อมูลเป็น batch
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+        payload = parse_scan_payload(data) if isinstance(data, dict) else None
+        if payload is None:
+            return JsonResponse({'error': SCAN_PAYLOAD_ERROR}, status=400)
+        tags, scanner_type, scanner_id = payload
+
+        reads = [
+            (tag['epc'], scanner_type, scanner_id)
+            for tag in tags
+            if isinstance(tag, dict) and tag.get('epc')
+        ]
+        if not scan_queue.put_many(reads):
+            return JsonResponse({'error': 'Ingest queue is full'}, status=503)
+        return JsonResponse({'queued': len(reads)}, status=202)
+
+class RFIDMetrics(APIView):
+    # ตัวนับของดัชนี EPC, debounce, คิว ingest และการส่ง stats ของโปรเซสนี้ ไว้ดูตอนโหลดสูง
+    def get(self, request):
+        return Response({
+            'index': epc_index.stats(),
+            'debounce': scan_debouncer.stats(),
+            'ingest': scan_queue.stats(),
+            'stats_broadcast': stats_broadcaster.stats(),
+        }, status=status.HTTP_200_OK)
+
 class LogPagination(PageNumberPagination):
     page_size = 5
 
@@ -1154,29 +1217,3 @@ class LogCreateView(APIView):
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-def person_to_dict(person):
-    return {
-        'name': person.name,
-        'nisit': person.nisit,
-        'degree': person.degree,
-        'seat': person.seat,
-        'verified1': person.verified1,
-        'verified2': person.verified2,
-        'verified3': person.verified3,
-        'verified_updated_at1': datetime_to_str(person.verified_updated_at1),
-        'verified_updated_at2': datetime_to_str(person.verified_updated_at2),
-        'verified_updated_at3': datetime_to_str(person.verified_updated_at3),
-        'rfid': person.rfid,
-    }
-
-def datetime_to_str(dt):
-    if dt is None:
-        return None
-    return dt.isoformat()
-
-def convert_datetime_fields(data: dict, fields: list):
-    for f in fields:
-        if f in data and isinstance(data[f], datetime):
-            data[f] = data[f].isoformat()
-    return data
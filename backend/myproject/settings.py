@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.APICompressionMiddleware',  # บีบอัด JSON ของ /api/ (brotli/gzip)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -159,10 +160,48 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # ใช้ orjson ถ้าติดตั้งไว้ (ดู api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # ตั้งค่าให้รองรับภาษาไทย
 IMPORT_EXPORT_USE_TRANSACTIONS = True  # ใช้ transaction เพื่อความปลอดภัย
 IMPORT_EXPORT_SKIP_ADMIN_LOG = True    # ปิด logging ถ้าไม่ต้องการ
-IMPORT_EXPORT_ENCODING = 'utf-8-sig'   # รองรับภาษาไทยใน Excel/CSV
\ No newline at end of file
+IMPORT_EXPORT_ENCODING = 'utf-8-sig'   # รองรับภาษาไทยใน Excel/CSV
+
+# RFID ingest แบบ async (/api/rfidAPI/ingest/)
+RFID_INGEST_BATCH_SIZE = config('RFID_INGEST_BATCH_SIZE', default=200, cast=int)   # เขียนครั้งละกี่การอ่าน
+RFID_INGEST_FLUSH_MS = config('RFID_INGEST_FLUSH_MS', default=20, cast=int)        # หรือทุกกี่มิลลิวินาที
+RFID_INGEST_QUEUE_SIZE = config('RFID_INGEST_QUEUE_SIZE', default=10000, cast=int) # ขนาดคิวสูงสุด
+RFID_INDEX_ENABLED = config('RFID_INDEX_ENABLED', default=True, cast=bool)         # ดัชนี EPC ในหน่วยความจำ
+RFID_DEBOUNCE_SECONDS = config('RFID_DEBOUNCE_SECONDS', default=2.0, cast=float) # ตัดการอ่านซ้ำภายในกี่วินาที (0 = ปิด)
+RFID_DEBOUNCE_MAX_KEYS = config('RFID_DEBOUNCE_MAX_KEYS', default=50000, cast=int)
+RFID_EVENT_BATCH_SIZE = config('RFID_EVENT_BATCH_SIZE', default=500, cast=int)     # bulk_create ScanEvent ครั้งละกี่แถว
+
+# ตัวนับสถิติและเวอร์ชันข้อมูลเก็บในตาราง SharedCounter (ใช้ร่วมกันทุกโปรเซส)
+# cache ใช้แค่ผลสรุปที่หมดอายุเองได้ ถ้ามีหลายโปรเซสตั้ง USE_REDIS_CACHE เพื่อให้ใช้ cache ร่วมกัน
+STATS_RECONCILE_SECONDS = config('STATS_RECONCILE_SECONDS', default=60, cast=int)  # นับใหม่ทั้งตารางทุกกี่วินาที
+if config('USE_REDIS_CACHE', default=False, cast=bool):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+STATS_BROADCAST_INTERVAL_MS = config('STATS_BROADCAST_INTERVAL_MS', default=500, cast=int)  # ส่ง stats ทาง WebSocket ไม่เกินครั้งละกี่มิลลิวินาที (0 = ส่งทันที)
+STATS_BREAKDOWN_CACHE_SECONDS = config('STATS_BREAKDOWN_CACHE_SECONDS', default=60, cast=int)  # อายุ cache ของ /api/stats/breakdown/ (ถูกล้างเมื่อข้อมูลเปลี่ยนอยู่แล้ว)
+STATS_ARRIVALS_CACHE_SECONDS = config('STATS_ARRIVALS_CACHE_SECONDS', default=15, cast=int)    # อายุ cache ของ /api/stats/arrivals/
+PERSON_PAGE_SIZE = config('PERSON_PAGE_SIZE', default=100, cast=int)  # จำนวนแถวต่อหน้าของ /api/person/ (ใช้ ?all=true เพื่อดึงทั้งหมด)
+PERSON_SYNC_OVERLAP_SECONDS = config('PERSON_SYNC_OVERLAP_SECONDS', default=5, cast=int)  # /api/person/changes/ ย้อนเวลาเผื่อกี่วินาที
+PERSON_SYNC_MAX_CHANGES = config('PERSON_SYNC_MAX_CHANGES', default=5000, cast=int)      # เกินนี้ให้ผู้ใช้โหลดใหม่ทั้งหมดแทน
+API_COMPRESS_MIN_BYTES = config('API_COMPRESS_MIN_BYTES', default=1024, cast=int)          # บีบอัด response ของ /api/ ที่ใหญ่กว่านี้
+API_COMPRESS_BROTLI_QUALITY = config('API_COMPRESS_BROTLI_QUALITY', default=4, cast=int)  # 0-11 ยิ่งสูงยิ่งเล็กแต่ช้า
+PERSON_STREAM_CHUNK_SIZE = config('PERSON_STREAM_CHUNK_SIZE', default=2000, cast=int)  # /api/person/?stream=true ดึงครั้งละกี่แถว
+WS_BULK_MAX_ITEMS = config('WS_BULK_MAX_ITEMS', default=500, cast=int)  # จำนวนแถวสูงสุดต่อข้อความ bulk_update/bulk_delete
+IMPORT_BULK_ENABLED = config('IMPORT_BULK_ENABLED', default=True, cast=bool)  # นำเข้าไฟล์ด้วย bulk_create/bulk_update (False = ทีละแถวผ่าน django-import-export)
+IMPORT_BATCH_SIZE = config('IMPORT_BATCH_SIZE', default=500, cast=int)          # จำนวนแถวต่อคำสั่ง INSERT/UPDATE ตอนนำเข้า
+PERSON_TOMBSTONE_RETENTION_HOURS = config('PERSON_TOMBSTONE_RETENTION_HOURS', default=24, cast=int)  # เก็บบันทึกการลบไว้กี่ชั่วโมง (token ที่เก่ากว่านี้ต้องโหลดใหม่ทั้งหมด)
@@ -0,0 +1,16 @@
+import api from '@/plugins/axios';
+
+// ดึงรายชื่อทั้งหมดทีละหน้าตาม cursor ของ /api/person/ (แบ่งหน้าแบบ keyset)
+export async function fetchAllPersons({ pageSize = 500, ordering = 'id', onPage } = {}) {
+    const persons = [];
+    let cursor = null;
+    do {
+        const params = { page_size: pageSize, ordering };
+        if (cursor) params.cursor = cursor;
+        const { data } = await api.get('/api/person/', { params });
+        persons.push(...data.results);
+        if (onPage) onPage(persons);
+        cursor = data.next ? new URL(data.next).searchParams.get('cursor') : null;
+    } while (cursor);
+    return persons;
+}